@@ -0,0 +1,144 @@
+﻿import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # 无需打开窗口
+
+import argparse
+import math
+import random
+import time
+import tracemalloc
+
+import pygame
+
+from construction_core import Camera, Construction, draw_elements, np
+
+WIDTH, HEIGHT = 1920, 1080
+
+# Construction generators: each returns a list of ("line" | "circle", element)
+def random_construction(n, rng):
+    """Random mix of lines and circles; element size shrinks with n to keep density steady"""
+    spread = max(WIDTH, HEIGHT) * min(1.0, 4 / math.sqrt(n))
+    elements = []
+    for _ in range(n):
+        p1 = (rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+        if rng.random() < 0.5:
+            angle = rng.uniform(0, 2 * math.pi)
+            length = rng.uniform(0, spread)
+            p2 = (p1[0] + length * math.cos(angle), p1[1] + length * math.sin(angle))
+            elements.append(("line", (p1, p2)))
+        else:
+            elements.append(("circle", (p1, rng.uniform(5, spread / 2))))
+    return elements
+
+def parallel_lines(n, rng):
+    """Full-width horizontal lines: overlapping bboxes, no intersections"""
+    return [("line", ((0, HEIGHT * (i + 0.5) / n), (WIDTH, HEIGHT * (i + 0.5) / n))) for i in range(n)]
+
+def concentric_circles(n, rng):
+    """Circles sharing one center: nested bboxes, degenerate pairs"""
+    center = (WIDTH / 2, HEIGHT / 2)
+    return [("circle", (center, 1 + (HEIGHT / 2) * i / n)) for i in range(n)]
+
+def near_tangent_circles(n, rng):
+    """Pairs of circles whose centers are r1 + r2 apart, give or take a tiny epsilon"""
+    spread = max(WIDTH, HEIGHT) * min(1.0, 4 / math.sqrt(n))
+    elements = []
+    for _ in range(n // 2):
+        r1, r2 = rng.uniform(2, spread / 4), rng.uniform(2, spread / 4)
+        x, y = rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)
+        angle = rng.uniform(0, 2 * math.pi)
+        d = r1 + r2 + rng.uniform(-1e-9, 1e-9)
+        elements.append(("circle", ((x, y), r1)))
+        elements.append(("circle", ((x + d * math.cos(angle), y + d * math.sin(angle)), r2)))
+    return elements
+
+SCENARIOS = {
+    "random": random_construction,
+    "parallel": parallel_lines,
+    "concentric": concentric_circles,
+    "near_tangent": near_tangent_circles,
+}
+
+def build(elements, exact=False):
+    construction = Construction(exact=exact)
+    for kind, element in elements:
+        if kind == "line":
+            construction.add_line(element)
+        else:
+            construction.add_circle(element)
+    return construction
+
+def measure(fn, repeat, alloc):
+    """Return (best seconds, peak traced bytes or None, result of the last run)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if alloc:
+        tracemalloc.start()
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, result
+
+def run_benchmarks(scenarios, sizes, repeat=1, alloc=True, max_scalar=2000, snap_queries=1000, seed=0):
+    """Time the geometry hot paths; yields one result dict per (scenario, size, op)"""
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    zoomed = Camera(WIDTH, HEIGHT, WIDTH * 3 / 8, HEIGHT * 3 / 8, 4.0)  # Centre quarter of the canvas
+    for name in scenarios:
+        for size in sizes:
+            rng = random.Random(seed)
+            elements = SCENARIOS[name](size, rng)
+            queries = [(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)) for _ in range(snap_queries)]
+            construction = build(elements) if size <= max_scalar else None
+
+            ops = []
+            if construction is not None:
+                ops.append(("add_incremental", lambda: build(elements), 1))
+                ops.append(("add_incremental_exact", lambda: build(elements, exact=True), 1))
+                ops.append(("find_all", construction.find_all_intersections, 1))
+            if np is not None:
+                if construction is None:
+                    construction = Construction()
+                    for kind, element in elements:
+                        (construction.lines if kind == "line" else construction.circles).append(element)
+                ops.append(("find_all_vectorized", lambda: construction.find_all_intersections(vectorized=True), 1))
+            if construction is not None:
+                ops.append(("snap_to_point", lambda: [construction.snap_to_point(q) for q in queries], len(queries)))
+                ops.append(("draw_elements", lambda: draw_elements(surface, construction), 1))
+                ops.append(("draw_elements_zoom4", lambda: draw_elements(surface, construction, zoomed), 1))
+
+            for op, fn, calls in ops:
+                seconds, peak, _ = measure(fn, repeat, alloc)
+                yield {
+                    "scenario": name,
+                    "size": len(elements),
+                    "op": op,
+                    "ms_per_call": seconds * 1000 / calls,
+                    "peak_kb": None if peak is None else peak / 1024,
+                    "intersections": len(construction.intersections),
+                }
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the construction geometry core")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per op, best is reported")
+    parser.add_argument("--max-scalar", type=int, default=2000,
+                        help="skip the pure-Python O(n^2) paths above this many elements")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pygame.init()
+    print(f"{'scenario':<14}{'size':>7}  {'op':<22}{'ms/call':>12}{'peak KiB':>12}{'points':>10}")
+    for row in run_benchmarks(args.scenarios, args.sizes, args.repeat, not args.no_alloc,
+                              args.max_scalar, seed=args.seed):
+        peak = "-" if row["peak_kb"] is None else f"{row['peak_kb']:.1f}"
+        print(f"{row['scenario']:<14}{row['size']:>7}  {row['op']:<22}"
+              f"{row['ms_per_call']:>12.3f}{peak:>12}{row['intersections']:>10}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
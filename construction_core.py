@@ -0,0 +1,785 @@
+﻿import pygame
+import math
+from fractions import Fraction
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Batch intersection kernels are unavailable without NumPy
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+GRAY = (220, 220, 220)  # 浅灰色背景格线
+LIGHT_BLUE = (173, 216, 230)
+GRID_COLOR = (230, 230, 230)  # 更浅的格线颜色
+
+grid_size = 20  # Grid spacing
+
+# Element kinds
+ELEMENT_LINE = 0
+ELEMENT_CIRCLE = 1
+
+class SpatialHash:
+    """Uniform grid of buckets for bbox broad-phase and nearest-point queries
+    
+    Items spanning more than max_cells cells are kept in a separate list that
+    every query scans, so huge circles do not flood hundreds of buckets.
+    """
+    def __init__(self, cell_size, max_cells=64):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self.cells = {}  # (cell_x, cell_y) -> [(item, bbox), ...]
+        self.large = []  # [(item, bbox), ...] for oversized items
+    
+    def _cell_range(self, bbox):
+        min_x, min_y, max_x, max_y = bbox
+        cs = self.cell_size
+        return (math.floor(min_x / cs), math.floor(min_y / cs),
+                math.floor(max_x / cs), math.floor(max_y / cs))
+    
+    def _cell_keys(self, bbox):
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                yield (cx, cy)
+    
+    def _is_large(self, bbox):
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        return (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.max_cells
+    
+    def clear(self):
+        self.cells = {}
+        self.large = []
+    
+    def insert(self, item, bbox):
+        if self._is_large(bbox):
+            self.large.append((item, bbox))
+            return
+        for key in self._cell_keys(bbox):
+            self.cells.setdefault(key, []).append((item, bbox))
+    
+    def remove(self, item, bbox):
+        """Remove one occurrence of item (matched by identity)"""
+        if self._is_large(bbox):
+            for i, (other, _) in enumerate(self.large):
+                if other is item:
+                    del self.large[i]
+                    break
+            return
+        for key in self._cell_keys(bbox):
+            bucket = self.cells.get(key)
+            if not bucket:
+                continue
+            for i, (other, _) in enumerate(bucket):
+                if other is item:
+                    del bucket[i]
+                    break
+            if not bucket:
+                del self.cells[key]
+    
+    def query(self, bbox):
+        """Return the items whose bbox overlaps the given bbox"""
+        min_x, min_y, max_x, max_y = bbox
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Query covers more cells than are occupied: walk the occupied ones
+            buckets = [bucket for (cx, cy), bucket in self.cells.items()
+                       if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+        else:
+            buckets = [self.cells.get(key, ()) for key in self._cell_keys(bbox)]
+        buckets.append(self.large)
+        
+        seen = set()
+        found = []
+        for bucket in buckets:
+            for item, (x0, y0, x1, y1) in bucket:
+                if id(item) in seen or x0 > max_x or x1 < min_x or y0 > max_y or y1 < min_y:
+                    continue
+                seen.add(id(item))
+                found.append(item)
+        return found
+    
+    def nearest(self, pos, radius):
+        """Return the closest point item strictly within radius of pos, or None"""
+        best = None
+        best_dist_sq = radius * radius
+        for p in self.query((pos[0] - radius, pos[1] - radius, pos[0] + radius, pos[1] + radius)):
+            dist_sq = (p[0] - pos[0])**2 + (p[1] - pos[1])**2
+            if dist_sq < best_dist_sq:
+                best = p
+                best_dist_sq = dist_sq
+        return best
+def distance(p1, p2):
+    """Calculate distance between two points"""
+    return math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
+
+def line_intersection(line1, line2):
+    """Find intersection point of two line segments"""
+    (x1, y1), (x2, y2) = line1
+    (x3, y3), (x4, y4) = line2
+    
+    denom = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    if denom == 0:  # Parallel or coincident
+        return None
+    
+    ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denom
+    ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denom
+    
+    if 0 <= ua <= 1 and 0 <= ub <= 1:  # Segments intersect
+        x = x1 + ua * (x2 - x1)
+        y = y1 + ua * (y2 - y1)
+        return (x, y)
+    return None
+
+def circle_line_intersection(circle, line):
+    """Find intersections between circle and line segment"""
+    (cx, cy), r = circle
+    (x1, y1), (x2, y2) = line
+    
+    # Convert line to general form: ax + by + c = 0
+    a = y2 - y1
+    b = x1 - x2
+    c = x2 * y1 - x1 * y2
+    
+    if a == 0 and b == 0:  # Degenerate segment
+        return []
+    
+    # Calculate distance from center to line
+    dist = abs(a * cx + b * cy + c) / math.sqrt(a**2 + b**2)
+    
+    if dist > r:  # No intersection
+        return []
+    
+    # Calculate intersection points
+    if b == 0:  # Vertical line
+        x = -c / a
+        term = math.sqrt(max(r**2 - (x - cx)**2, 0))
+        ya = cy + term
+        yb = cy - term
+        # Check if points are on the segment
+        intersections = []
+        if min(y1, y2) <= ya <= max(y1, y2):
+            intersections.append((x, ya))
+        if term != 0 and min(y1, y2) <= yb <= max(y1, y2):  # Tangent gives one point
+            intersections.append((x, yb))
+        return intersections
+    else:
+        m = -a / b
+        k = -c / b
+        A = 1 + m**2
+        B = -2 * cx + 2 * m * (k - cy)
+        C = cx**2 + (k - cy)**2 - r**2
+        
+        discriminant = B**2 - 4 * A * C
+        if discriminant < 0:  # No intersection
+            return []
+        
+        x1 = (-B + math.sqrt(discriminant)) / (2 * A)
+        x2 = (-B - math.sqrt(discriminant)) / (2 * A)
+        y1 = m * x1 + k
+        y2 = m * x2 + k
+        
+        # Check if points are on the segment
+        intersections = []
+        if min(line[0][0], line[1][0]) <= x1 <= max(line[0][0], line[1][0]):
+            intersections.append((x1, y1))
+        if discriminant != 0 and min(line[0][0], line[1][0]) <= x2 <= max(line[0][0], line[1][0]):
+            intersections.append((x2, y2))
+        return intersections
+
+def circle_intersection(circle1, circle2):
+    """Find intersections between two circles"""
+    (x1, y1), r1 = circle1
+    (x2, y2), r2 = circle2
+    
+    # Calculate distance between centers
+    d = distance((x1, y1), (x2, y2))
+    
+    # Check if circles intersect
+    if d > r1 + r2 or d < abs(r1 - r2) or d == 0:
+        return []  # No intersection (or concentric)
+    
+    # Calculate intersection points
+    a = (r1**2 - r2**2 + d**2) / (2 * d)
+    h = math.sqrt(max(r1**2 - a**2, 0))
+    
+    xm = x1 + a * (x2 - x1) / d
+    ym = y1 + a * (y2 - y1) / d
+    
+    xs1 = xm + h * (y2 - y1) / d
+    ys1 = ym - h * (x2 - x1) / d
+    
+    xs2 = xm - h * (y2 - y1) / d
+    ys2 = ym + h * (x2 - x1) / d
+    
+    if xs1 == xs2 and ys1 == ys2:  # Tangent
+        return [(xs1, ys1)]
+    else:
+        return [(xs1, ys1), (xs2, ys2)]
+
+def batch_line_intersections(segs_a, segs_b):
+    """Intersect every segment of segs_a (Nx4) with every segment of segs_b (Mx4)
+    
+    Returns (points, ia, ib): a Kx2 array of intersection points and the row
+    indices of the two segments that produced each point.
+    """
+    x1, y1, x2, y2 = (segs_a[:, k, None] for k in range(4))
+    x3, y3, x4, y4 = (segs_b[None, :, k] for k in range(4))
+    
+    denom = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denom
+        ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denom
+    
+    # Parallel or coincident segments have denom == 0 and never hit
+    hit = (denom != 0) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+    ia, ib = np.nonzero(hit)
+    ua = ua[ia, ib]
+    x = segs_a[ia, 0] + ua * (segs_a[ia, 2] - segs_a[ia, 0])
+    y = segs_a[ia, 1] + ua * (segs_a[ia, 3] - segs_a[ia, 1])
+    return np.column_stack((x, y)), ia, ib
+
+def batch_circle_line_intersections(circs, segs):
+    """Intersect every circle of circs (Nx3: cx, cy, r) with every segment of segs (Mx4)
+    
+    Returns (points, ic, il) like batch_line_intersections; tangents yield one point.
+    """
+    cx, cy, r = (circs[:, k, None] for k in range(3))
+    x1, y1, x2, y2 = (segs[None, :, k] for k in range(4))
+    
+    # Line in general form: ax + by + c = 0
+    a = y2 - y1
+    b = x1 - x2
+    c = x2 * y1 - x1 * y2
+    vertical = b == 0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = np.abs(a * cx + b * cy + c) / np.sqrt(a**2 + b**2)
+        valid = ~((a == 0) & vertical) & (dist <= r)
+        
+        # Vertical lines
+        xv = -c / a
+        term = np.sqrt(np.maximum(r**2 - (xv - cx)**2, 0))
+        
+        # Other lines: y = mx + k
+        m = -a / b
+        k = -c / b
+        A = 1 + m**2
+        B = -2 * cx + 2 * m * (k - cy)
+        C = cx**2 + (k - cy)**2 - r**2
+        discriminant = B**2 - 4 * A * C
+        root = np.sqrt(discriminant)
+        xg1 = (-B + root) / (2 * A)
+        xg2 = (-B - root) / (2 * A)
+    
+    valid &= vertical | (discriminant >= 0)
+    tangent = np.where(vertical, term == 0, discriminant == 0)
+    px1 = np.where(vertical, xv, xg1)
+    py1 = np.where(vertical, cy + term, m * xg1 + k)
+    px2 = np.where(vertical, xv, xg2)
+    py2 = np.where(vertical, cy - term, m * xg2 + k)
+    
+    # Keep only points on the segment
+    lo = np.where(vertical, np.minimum(y1, y2), np.minimum(x1, x2))
+    hi = np.where(vertical, np.maximum(y1, y2), np.maximum(x1, x2))
+    along1 = np.where(vertical, py1, px1)
+    along2 = np.where(vertical, py2, px2)
+    first = valid & (lo <= along1) & (along1 <= hi)
+    second = valid & ~tangent & (lo <= along2) & (along2 <= hi)
+    
+    ic1, il1 = np.nonzero(first)
+    ic2, il2 = np.nonzero(second)
+    points = np.concatenate((
+        np.column_stack((px1[ic1, il1], py1[ic1, il1])),
+        np.column_stack((px2[ic2, il2], py2[ic2, il2])),
+    ))
+    return points, np.concatenate((ic1, ic2)), np.concatenate((il1, il2))
+
+def batch_circle_intersections(circs_a, circs_b):
+    """Intersect every circle of circs_a (Nx3) with every circle of circs_b (Mx3)
+    
+    Returns (points, ia, ib) like batch_line_intersections; tangents yield one point.
+    """
+    x1, y1, r1 = (circs_a[:, k, None] for k in range(3))
+    x2, y2, r2 = (circs_b[None, :, k] for k in range(3))
+    
+    d = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    valid = (d <= r1 + r2) & (d >= np.abs(r1 - r2)) & (d != 0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = (r1**2 - r2**2 + d**2) / (2 * d)
+        h = np.sqrt(np.maximum(r1**2 - a**2, 0))
+        xm = x1 + a * (x2 - x1) / d
+        ym = y1 + a * (y2 - y1) / d
+        dx = h * (y2 - y1) / d
+        dy = h * (x2 - x1) / d
+    
+    ia1, ib1 = np.nonzero(valid)
+    ia2, ib2 = np.nonzero(valid & (h != 0))
+    points = np.concatenate((
+        np.column_stack((xm[ia1, ib1] + dx[ia1, ib1], ym[ia1, ib1] - dy[ia1, ib1])),
+        np.column_stack((xm[ia2, ib2] - dx[ia2, ib2], ym[ia2, ib2] + dy[ia2, ib2])),
+    ))
+    return points, np.concatenate((ia1, ia2)), np.concatenate((ib1, ib2))
+
+def batch_all_intersections(kernel, arr_a, arr_b, upper=False, block_pairs=1 << 20):
+    """Run a batch kernel over arr_a x arr_b in row blocks to bound memory
+    
+    With upper=True, arr_a and arr_b are the same array and only pairs i < j are kept.
+    """
+    step = max(1, block_pairs // max(1, len(arr_b)))
+    chunks = []
+    for start in range(0, len(arr_a), step):
+        if upper:
+            points, ia, ib = kernel(arr_a[start:start + step], arr_b[start:])
+            keep = ib > ia
+            points, ia, ib = points[keep], ia[keep] + start, ib[keep] + start
+        else:
+            points, ia, ib = kernel(arr_a[start:start + step], arr_b)
+            ia = ia + start
+        chunks.append((points, ia, ib))
+    
+    if not chunks:
+        return np.empty((0, 2)), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+def exact_line_intersection(line1, line2):
+    """line_intersection with exact rational predicates (parallel and endpoint cases)"""
+    (x1, y1), (x2, y2) = [(Fraction(x), Fraction(y)) for x, y in line1]
+    (x3, y3), (x4, y4) = [(Fraction(x), Fraction(y)) for x, y in line2]
+    
+    denom = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    if denom == 0:  # Parallel or coincident
+        return None
+    
+    ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denom
+    ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denom
+    
+    if 0 <= ua <= 1 and 0 <= ub <= 1:  # Segments intersect
+        return (float(x1 + ua * (x2 - x1)), float(y1 + ua * (y2 - y1)))
+    return None
+
+def exact_circle_line_intersection(circle, line):
+    """circle_line_intersection with exact rational predicates (tangency, endpoints on the circle)"""
+    (cx, cy), r = circle
+    cx, cy, r = Fraction(cx), Fraction(cy), Fraction(r)
+    (x1, y1), (x2, y2) = [(Fraction(x), Fraction(y)) for x, y in line]
+    
+    # Points on the segment: P1 + t * (P2 - P1), 0 <= t <= 1; solve |P - C|^2 = r^2
+    dx, dy = x2 - x1, y2 - y1
+    fx, fy = x1 - cx, y1 - cy
+    A = dx * dx + dy * dy
+    B = 2 * (dx * fx + dy * fy)
+    C = fx * fx + fy * fy - r * r
+    if A == 0:  # Degenerate segment
+        return []
+    
+    discriminant = B * B - 4 * A * C
+    if discriminant < 0:  # No intersection
+        return []
+    if discriminant == 0:  # Tangent
+        t = -B / (2 * A)
+        return [(float(x1 + t * dx), float(y1 + t * dy))] if 0 <= t <= 1 else []
+    
+    # Exact sign tests for 0 <= t <= 1 with t = (-B +/- sqrt(discriminant)) / 2A
+    end = 2 * A + B
+    roots = []
+    if (B <= 0 or C <= 0) and end >= 0 and discriminant <= end * end:
+        roots.append(1)
+    if B <= 0 and C >= 0 and (end >= 0 or discriminant >= end * end):
+        roots.append(-1)
+    
+    root = math.sqrt(discriminant)
+    intersections = []
+    for sign in roots:
+        t = (float(-B) + sign * root) / float(2 * A)
+        intersections.append((float(x1) + t * float(dx), float(y1) + t * float(dy)))
+    return intersections
+
+def exact_circle_intersection(circle1, circle2):
+    """circle_intersection with exact rational predicates (tangency, concentric circles)"""
+    (x1, y1), r1 = circle1
+    (x2, y2), r2 = circle2
+    x1, y1, r1, x2, y2, r2 = (Fraction(v) for v in (x1, y1, r1, x2, y2, r2))
+    
+    dx, dy = x2 - x1, y2 - y1
+    d_sq = dx * dx + dy * dy
+    if d_sq == 0 or d_sq > (r1 + r2)**2 or d_sq < (r1 - r2)**2:
+        return []  # No intersection (or concentric)
+    
+    # a/d and (h/d)^2 are rational, so the chord midpoint is exact
+    a_over_d = (r1 * r1 - r2 * r2 + d_sq) / (2 * d_sq)
+    h_over_d_sq = r1 * r1 / d_sq - a_over_d * a_over_d
+    xm = x1 + a_over_d * dx
+    ym = y1 + a_over_d * dy
+    if h_over_d_sq == 0:  # Tangent
+        return [(float(xm), float(ym))]
+    
+    h_over_d = math.sqrt(h_over_d_sq)
+    return [
+        (float(xm) + h_over_d * float(dy), float(ym) - h_over_d * float(dx)),
+        (float(xm) - h_over_d * float(dy), float(ym) + h_over_d * float(dx)),
+    ]
+
+def pair_intersections(element_a, kind_a, element_b, kind_b, exact=False):
+    """Intersect two elements; element_a is the older one, matching full recomputation order"""
+    if kind_a == ELEMENT_LINE and kind_b == ELEMENT_LINE:
+        intersection = (exact_line_intersection if exact else line_intersection)(element_a, element_b)
+        return [intersection] if intersection else []
+    if kind_a == ELEMENT_CIRCLE and kind_b == ELEMENT_CIRCLE:
+        return (exact_circle_intersection if exact else circle_intersection)(element_a, element_b)
+    circle_line = exact_circle_line_intersection if exact else circle_line_intersection
+    if kind_a == ELEMENT_CIRCLE:
+        return circle_line(element_a, element_b)
+    return circle_line(element_b, element_a)
+
+def point_bbox(p):
+    return (p[0], p[1], p[0], p[1])
+
+def element_bbox(element, kind):
+    """Axis-aligned bounding box (min_x, min_y, max_x, max_y) of a line or circle"""
+    if kind == ELEMENT_LINE:
+        (x1, y1), (x2, y2) = element
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+    (cx, cy), r = element
+    return (cx - r, cy - r, cx + r, cy + r)
+
+class IntersectionStore:
+    """Distinct intersection points, merged within epsilon via a hash grid on quantized coordinates
+    
+    Each point records the elements it lies on, so concurrent lines or circles
+    through a common point produce one stored point instead of many.
+    """
+    def __init__(self, epsilon=1e-6):
+        self.epsilon = epsilon
+        self.points = {}  # point id -> (x, y)
+        self.elements = {}  # point id -> elements the point lies on
+        self.pairs = {}  # point id -> [(element_a, element_b)] pairs actually found meeting there
+        self.cells = {}  # quantized (x, y) -> [point ids]
+        self.by_element = {}  # id(element) -> {point ids}
+        self.next_id = 0
+    
+    def __len__(self):
+        return len(self.points)
+    
+    def __iter__(self):
+        return iter(self.points.values())
+    
+    def _key(self, p):
+        return (math.floor(p[0] / self.epsilon), math.floor(p[1] / self.epsilon))
+    
+    def find(self, p):
+        """Return the id of a stored point within epsilon of p, or None"""
+        kx, ky = self._key(p)
+        eps_sq = self.epsilon * self.epsilon
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for pid in self.cells.get((kx + dx, ky + dy), ()):
+                    q = self.points[pid]
+                    if (q[0] - p[0])**2 + (q[1] - p[1])**2 <= eps_sq:
+                        return pid
+        return None
+    
+    def elements_at(self, p):
+        """Elements passing through the stored point nearest p (within epsilon)"""
+        pid = self.find(p)
+        return [] if pid is None else list(self.elements[pid])
+    
+    def add(self, p, element_a, element_b):
+        """Record that two elements meet at p; return p if it is a new point, else None"""
+        pid = self.find(p)
+        is_new = pid is None
+        if is_new:
+            pid = self.next_id
+            self.next_id += 1
+            self.points[pid] = p
+            self.elements[pid] = []
+            self.cells.setdefault(self._key(p), []).append(pid)
+        
+        self.pairs.setdefault(pid, []).append((element_a, element_b))
+        on = self.elements[pid]
+        for element in (element_a, element_b):
+            if not any(other is element for other in on):
+                on.append(element)
+                self.by_element.setdefault(id(element), set()).add(pid)
+        return p if is_new else None
+    
+    def remove_element(self, element):
+        """Detach an element from its points; return the points no remaining pair meets at"""
+        removed = []
+        for pid in self.by_element.pop(id(element), ()):
+            # Elements merged onto a point need not meet each other (e.g. coincident
+            # lines crossed by a third), so keep only those still paired there
+            pairs = [(a, b) for a, b in self.pairs[pid] if a is not element and b is not element]
+            on = [other for other in self.elements[pid]
+                  if any(other is a or other is b for a, b in pairs)]
+            for other in self.elements[pid]:
+                if other is not element and not any(other is kept for kept in on):
+                    pids = self.by_element[id(other)]
+                    pids.discard(pid)
+                    if not pids:
+                        del self.by_element[id(other)]
+            if pairs:
+                self.pairs[pid] = pairs
+                self.elements[pid] = on
+                continue
+            
+            p = self.points.pop(pid)
+            del self.elements[pid]
+            del self.pairs[pid]
+            bucket = self.cells[self._key(p)]
+            bucket.remove(pid)
+            if not bucket:
+                del self.cells[self._key(p)]
+            removed.append(p)
+        return removed
+
+class Camera:
+    """World-to-screen transform with pan and zoom: screen = (world - (x, y)) * zoom"""
+    def __init__(self, width, height, x=0.0, y=0.0, zoom=1.0):
+        self.width = width
+        self.height = height
+        self.x = x  # World coordinates shown at the top-left corner
+        self.y = y
+        self.zoom = zoom
+    
+    def to_screen(self, p):
+        return ((p[0] - self.x) * self.zoom, (p[1] - self.y) * self.zoom)
+    
+    def to_world(self, p):
+        return (p[0] / self.zoom + self.x, p[1] / self.zoom + self.y)
+    
+    def viewport(self, margin=0):
+        """World bbox visible on screen, grown by margin screen pixels"""
+        m = margin / self.zoom
+        return (self.x - m, self.y - m,
+                self.x + self.width / self.zoom + m, self.y + self.height / self.zoom + m)
+    
+    def pan(self, dx, dy):
+        """Move the view by a screen-space delta"""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+    
+    def zoom_at(self, screen_pos, factor, min_zoom=1e-3, max_zoom=1e3):
+        """Zoom by factor keeping the world point under screen_pos fixed"""
+        wx, wy = self.to_world(screen_pos)
+        self.zoom = min(max(self.zoom * factor, min_zoom), max_zoom)
+        self.x = wx - screen_pos[0] / self.zoom
+        self.y = wy - screen_pos[1] / self.zoom
+    
+    def encloses_viewport(self, circle, margin=0):
+        """True if the whole viewport lies inside the circle, so its outline is off-screen"""
+        (cx, cy), r = circle
+        x0, y0, x1, y1 = self.viewport(margin)
+        far_x = max(abs(x0 - cx), abs(x1 - cx))
+        far_y = max(abs(y0 - cy), abs(y1 - cy))
+        return far_x * far_x + far_y * far_y < r * r
+
+class Construction:
+    """Lines, circles and their intersections, with spatial indexes kept in sync
+    
+    With exact=True the scalar intersection path decides parallel, tangent and
+    on-segment cases with rational arithmetic instead of float comparisons.
+    """
+    def __init__(self, snap_distance=15, epsilon=1e-6, exact=False):
+        self.snap_distance = snap_distance  # Pixel distance for snapping
+        self.exact = exact
+        self.lines = []  # Stores all line segments (point1, point2)
+        self.circles = []  # Stores all circles (center, radius)
+        self.intersections = IntersectionStore(epsilon)  # Distinct intersection points
+        
+        # Spatial indexes, kept up to date as elements are added and removed
+        self.line_index = SpatialHash(64)  # Broad phase for line segments
+        self.circle_index = SpatialHash(64)  # Broad phase for circles
+        self.intersection_index = SpatialHash(snap_distance * 2)  # Snap targets, highest priority first
+        self.endpoint_index = SpatialHash(snap_distance * 2)
+        self.center_index = SpatialHash(snap_distance * 2)
+    
+    def find_all_intersections(self, vectorized=False):
+        """Rebuild all intersections and spatial indexes from the element lists
+        
+        With vectorized=True (and NumPy available) all pairs are resolved by the
+        batch kernels instead of the pruned scalar path; exact mode is not applied there.
+        """
+        self.intersections = IntersectionStore(self.intersections.epsilon)
+        for index in (self.line_index, self.circle_index, self.intersection_index,
+                      self.endpoint_index, self.center_index):
+            index.clear()
+        
+        lines, circles = self.lines, self.circles
+        if vectorized and np is not None:
+            for line in lines:
+                self.index_element(line, ELEMENT_LINE)
+            for circle in circles:
+                self.index_element(circle, ELEMENT_CIRCLE)
+            
+            segs = np.array([(p1[0], p1[1], p2[0], p2[1]) for p1, p2 in lines], dtype=np.float64).reshape(-1, 4)
+            circs = np.array([(c[0], c[1], r) for c, r in circles], dtype=np.float64).reshape(-1, 3)
+            batches = (
+                (lines, lines, batch_all_intersections(batch_line_intersections, segs, segs, upper=True)),
+                (circles, lines, batch_all_intersections(batch_circle_line_intersections, circs, segs)),
+                (circles, circles, batch_all_intersections(batch_circle_intersections, circs, circs, upper=True)),
+            )
+            for elements_a, elements_b, (points, ia, ib) in batches:
+                for p, i, j in zip(points.tolist(), ia.tolist(), ib.tolist()):
+                    self.store_intersection(tuple(p), elements_a[i], elements_b[j])
+            return
+        
+        # Re-adding in order tests every pair once, older element first
+        self.lines, self.circles = [], []
+        for line in lines:
+            self.add_line(line)
+        for circle in circles:
+            self.add_circle(circle)
+    
+    def store_intersection(self, p, element_a, element_b):
+        if self.intersections.add(p, element_a, element_b) is not None:
+            self.intersection_index.insert(p, point_bbox(p))
+    
+    def add_element_intersections(self, element, kind):
+        """Intersect a new element with the existing ones whose bboxes overlap it"""
+        bbox = element_bbox(element, kind)
+        for other_kind, index in ((ELEMENT_LINE, self.line_index), (ELEMENT_CIRCLE, self.circle_index)):
+            for other in index.query(bbox):
+                for p in pair_intersections(other, other_kind, element, kind, self.exact):
+                    self.store_intersection(p, other, element)
+    
+    def index_element(self, element, kind):
+        """Insert an element and its snap points into the spatial indexes"""
+        if kind == ELEMENT_LINE:
+            self.line_index.insert(element, element_bbox(element, kind))
+            for p in element:
+                self.endpoint_index.insert(p, point_bbox(p))
+        else:
+            self.circle_index.insert(element, element_bbox(element, kind))
+            self.center_index.insert(element[0], point_bbox(element[0]))
+    
+    def add_line(self, line):
+        """Add a line segment and update intersections incrementally"""
+        self.add_element_intersections(line, ELEMENT_LINE)
+        self.lines.append(line)
+        self.index_element(line, ELEMENT_LINE)
+    
+    def add_circle(self, circle):
+        """Add a circle and update intersections incrementally"""
+        self.add_element_intersections(circle, ELEMENT_CIRCLE)
+        self.circles.append(circle)
+        self.index_element(circle, ELEMENT_CIRCLE)
+    
+    def remove_element(self, element):
+        """Remove a line or circle and drop only the intersections it produced
+        
+        Returns the element kind, or None if the element was not present.
+        """
+        kind = None
+        # Search from the end: undoing the latest addition is the common case
+        for i in range(len(self.lines) - 1, -1, -1):
+            if self.lines[i] is element:
+                del self.lines[i]
+                self.line_index.remove(element, element_bbox(element, ELEMENT_LINE))
+                for p in element:
+                    self.endpoint_index.remove(p, point_bbox(p))
+                kind = ELEMENT_LINE
+                break
+        for i in range(len(self.circles) - 1, -1, -1):
+            if self.circles[i] is element:
+                del self.circles[i]
+                self.circle_index.remove(element, element_bbox(element, ELEMENT_CIRCLE))
+                self.center_index.remove(element[0], point_bbox(element[0]))
+                kind = ELEMENT_CIRCLE
+                break
+        
+        for p in self.intersections.remove_element(element):
+            self.intersection_index.remove(p, point_bbox(p))
+        return kind
+    
+    def replace_element(self, old, new):
+        """Swap an element for moved geometry, updating only its own intersections"""
+        kind = self.remove_element(old)
+        if kind == ELEMENT_LINE:
+            self.add_line(new)
+        elif kind == ELEMENT_CIRCLE:
+            self.add_circle(new)
+    
+    def snap_to_point(self, pos, radius=None):
+        """Snap to nearby points or intersections with visual feedback
+        
+        radius defaults to snap_distance; pass snap_distance / zoom when pos is in
+        world coordinates of a zoomed view.
+        """
+        if radius is None:
+            radius = self.snap_distance
+        
+        # Check intersections first, then line endpoints, then circle centers
+        snap_target = None
+        for index in (self.intersection_index, self.endpoint_index, self.center_index):
+            snap_target = index.nearest(pos, radius)
+            if snap_target:
+                break
+        
+        # Snap to grid if no other target found
+        if not snap_target and False:  # Disable grid snapping for now
+            grid_x = round(pos[0] / grid_size) * grid_size
+            grid_y = round(pos[1] / grid_size) * grid_size
+            snap_target = (grid_x, grid_y)
+        
+        return snap_target if snap_target else pos
+
+def draw_grid(surface, camera=None):
+    """Draw background grid with lighter color and thinner lines
+    
+    When zoomed out the spacing grows in steps of 5 so lines stay at least 8px apart.
+    """
+    width, height = surface.get_size()
+    if camera is None:
+        camera = Camera(width, height)
+    step = grid_size
+    while step * camera.zoom < 8:
+        step *= 5
+    
+    x0, y0, x1, y1 = camera.viewport()
+    for i in range(math.ceil(x0 / step), math.floor(x1 / step) + 1):
+        x = (i * step - camera.x) * camera.zoom
+        pygame.draw.line(surface, GRID_COLOR, (x, 0), (x, height), 1)
+    for i in range(math.ceil(y0 / step), math.floor(y1 / step) + 1):
+        y = (i * step - camera.y) * camera.zoom
+        pygame.draw.line(surface, GRID_COLOR, (0, y), (width, y), 1)
+
+def draw_elements(surface, construction, camera=None):
+    """Draw the committed elements visible through the camera with anti-aliasing
+    
+    Elements are culled against the viewport through the spatial indexes.
+    Sub-pixel circles are skipped and intersection markers that would overlap
+    on screen are drawn once.
+    """
+    if camera is None:
+        camera = Camera(*surface.get_size())
+    to_screen = camera.to_screen
+    
+    # Draw permanent lines with anti-aliasing
+    for line in construction.line_index.query(camera.viewport(1)):
+        pygame.draw.aaline(surface, BLACK, to_screen(line[0]), to_screen(line[1]), True)
+    
+    # Draw permanent circles with anti-aliasing
+    for circle in construction.circle_index.query(camera.viewport(2)):
+        radius = circle[1] * camera.zoom
+        if radius < 1 or camera.encloses_viewport(circle, 2):
+            continue
+        center = to_screen(circle[0])
+        pygame.draw.circle(surface, BLACK, (int(center[0]), int(center[1])), int(radius), 2)
+        # For anti-aliased circles, draw two circles (thickness 1 + 1 = 2)
+        pygame.draw.circle(surface, BLACK, (int(center[0]), int(center[1])), int(radius)-1, 1)
+    
+    # Draw intersection points, one marker per 8px screen cell
+    marked = set()
+    for p in construction.intersection_index.query(camera.viewport(4)):
+        x, y = to_screen(p)
+        cell = (int(x) // 8, int(y) // 8)
+        if cell in marked:
+            continue
+        marked.add(cell)
+        pygame.draw.rect(surface, RED, (x - 4, y - 4, 8, 8))
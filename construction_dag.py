@@ -0,0 +1,222 @@
+﻿from construction_core import ELEMENT_LINE, ELEMENT_CIRCLE, distance, pair_intersections
+
+class Node:
+    """A construction object whose value is derived from its parent nodes
+    
+    Values are memoized: invalidation only marks a node dirty, and it is
+    recomputed lazily the next time its value is read. Subclasses provide
+    compute(), which derives the value from the parents' values.
+    """
+    kind = None  # ELEMENT_LINE / ELEMENT_CIRCLE for elements, None for points
+    
+    def __init__(self, parents=()):
+        self.parents = list(parents)
+        self.children = []
+        self.order = 0  # Creation index, assigned by the graph
+        self.cached = None
+        self.dirty = True
+        for parent in self.parents:
+            parent.children.append(self)
+    
+    @property
+    def value(self):
+        if self.dirty:
+            self.cached = self.compute()
+            self.dirty = False
+        return self.cached
+
+class FreePoint(Node):
+    """A point placed directly by the user; the only kind of node that can be moved"""
+    def __init__(self, pos):
+        super().__init__()
+        self.pos = pos
+    
+    def compute(self):
+        return self.pos
+
+class IntersectionPoint(Node):
+    """One intersection of two elements, following the branch nearest its last position
+    
+    exact selects the same intersection kernel as the construction's exact mode,
+    so tangent and parallel cases are decided the same way while dragging.
+    """
+    def __init__(self, element_a, element_b, near, exact=False):
+        super().__init__((element_a, element_b))
+        self.last = near
+        self.exact = exact
+    
+    def compute(self):
+        a, b = self.parents
+        if a.value is None or b.value is None:
+            return None
+        candidates = pair_intersections(a.value, a.kind, b.value, b.kind, self.exact)
+        if not candidates:
+            return None  # Undefined until the elements meet again
+        lx, ly = self.last
+        self.last = min(candidates, key=lambda p: (p[0] - lx)**2 + (p[1] - ly)**2)
+        return self.last
+
+class LineNode(Node):
+    kind = ELEMENT_LINE
+    
+    def __init__(self, start, end):
+        super().__init__((start, end))
+        self.element = None  # Geometry currently stored in the document
+    
+    def compute(self):
+        start, end = self.parents
+        if start.value is None or end.value is None:
+            return None
+        return (start.value, end.value)
+
+class CircleNode(Node):
+    """Circle from a center point and either a point on the circle or a fixed radius"""
+    kind = ELEMENT_CIRCLE
+    
+    def __init__(self, center, through=None, radius=None):
+        super().__init__((center,) if through is None else (center, through))
+        self.radius = radius
+        self.element = None
+    
+    def compute(self):
+        center = self.parents[0].value
+        if center is None:
+            return None
+        if len(self.parents) == 1:
+            return (center, self.radius)
+        through = self.parents[1].value
+        if through is None:
+            return None
+        return (center, distance(center, through))
+
+class ConstructionGraph:
+    """Construction stored as a dependency DAG of points, lines and circles
+    
+    The document holds the current geometry. Moving a free point invalidates
+    its descendants; evaluate() then recomputes just those nodes in topological
+    (creation) order and replaces only the changed elements in the document.
+    Elements whose parents become undefined keep their last geometry.
+    """
+    def __init__(self, document):
+        self.document = document
+        self.nodes = []  # Creation order is a topological order
+        self.free_points = []
+        self.point_nodes = {}  # Current point value -> node, for snapping onto existing points
+        self.element_nodes = {}  # id(element in the document) -> node
+        self.pending = set()  # Invalidated nodes awaiting evaluate()
+    
+    @classmethod
+    def from_document(cls, document):
+        """Graph over an existing (e.g. loaded) document, its elements adopted on free points"""
+        graph = cls(document)
+        for line in document.construction.lines:
+            graph.adopt(line, ELEMENT_LINE)
+        for circle in document.construction.circles:
+            graph.adopt(circle, ELEMENT_CIRCLE)
+        return graph
+    
+    def _register(self, node):
+        node.order = len(self.nodes)
+        self.nodes.append(node)
+        if node.kind is None and node.value is not None:
+            self.point_nodes[node.value] = node
+        return node
+    
+    def _attach(self, node, element=None):
+        """Register an element node, adding its geometry to the document unless adopted"""
+        self._register(node)
+        if element is None:
+            element = node.value
+            if node.kind == ELEMENT_LINE:
+                self.document.add_line(element)
+            else:
+                self.document.add_circle(element)
+        else:
+            node.cached = element
+            node.dirty = False
+        node.element = element
+        self.element_nodes[id(element)] = node
+        return node
+    
+    def free_point(self, pos):
+        node = self._register(FreePoint(pos))
+        self.free_points.append(node)
+        return node
+    
+    def intersection_point(self, element_a, element_b, near):
+        a, b = sorted((element_a, element_b), key=lambda n: n.order)
+        return self._register(IntersectionPoint(a, b, near, self.document.construction.exact))
+    
+    def point_at(self, pos):
+        """Point node for a (snapped) position: an existing point, an intersection, or a new free point"""
+        node = self.point_nodes.get(pos)
+        if node is not None:
+            return node
+        parents = [self.element_nodes[id(e)]
+                   for e in self.document.construction.intersections.elements_at(pos)
+                   if id(e) in self.element_nodes]
+        if len(parents) >= 2:
+            return self.intersection_point(parents[0], parents[1], pos)
+        return self.free_point(pos)
+    
+    def line(self, start, end):
+        return self._attach(LineNode(start, end))
+    
+    def circle(self, center, through=None, radius=None):
+        return self._attach(CircleNode(center, through, radius))
+    
+    def adopt(self, element, kind):
+        """Wrap geometry already in the document (e.g. after loading) as nodes on free points"""
+        if kind == ELEMENT_LINE:
+            return self._attach(LineNode(self.point_at(element[0]), self.point_at(element[1])), element)
+        return self._attach(CircleNode(self.point_at(element[0]), radius=element[1]), element)
+    
+    def free_point_near(self, pos, radius):
+        """Closest free point strictly within radius of pos, or None"""
+        best, best_dist_sq = None, radius * radius
+        for node in self.free_points:
+            x, y = node.pos
+            dist_sq = (x - pos[0])**2 + (y - pos[1])**2
+            if dist_sq < best_dist_sq:
+                best, best_dist_sq = node, dist_sq
+        return best
+    
+    def invalidate(self, node):
+        """Mark node and everything downstream of it dirty"""
+        stack = [node]
+        seen = set()
+        while stack:
+            n = stack.pop()
+            if n in seen:
+                continue
+            seen.add(n)
+            n.dirty = True
+            self.pending.add(n)
+            stack.extend(n.children)
+    
+    def move(self, point, pos):
+        point.pos = pos
+        self.invalidate(point)
+    
+    def evaluate(self):
+        """Recompute invalidated nodes in topological order; return True if anything was pending"""
+        if not self.pending:
+            return False
+        for node in sorted(self.pending, key=lambda n: n.order):
+            if node.kind is None:
+                old = node.cached
+                if old is not None and self.point_nodes.get(old) is node:
+                    del self.point_nodes[old]
+                if node.value is not None:
+                    self.point_nodes[node.value] = node
+                continue
+            
+            new = node.value
+            if new is None or new == node.element:
+                continue
+            self.document.replace_element(node.element, new)
+            del self.element_nodes[id(node.element)]
+            node.element = new
+            self.element_nodes[id(new)] = node
+        self.pending.clear()
+        return True
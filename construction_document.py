@@ -0,0 +1,209 @@
+﻿import struct
+
+from construction_core import Construction, np
+
+# Journal operations
+OP_ADD_LINE = 0
+OP_ADD_CIRCLE = 1
+OP_DELETE = 2
+
+# Binary file layout (little endian):
+#   header: magic, version, operation count
+#   then per operation: u8 opcode + payload
+#     add line: x1, y1, x2, y2 (float64)   add circle: cx, cy, r (float64)
+#     delete: u32 journal index of the operation that added the element
+FILE_MAGIC = b"GCON"
+FILE_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_OPCODE = struct.Struct("<B")
+_LINE = struct.Struct("<4d")
+_CIRCLE = struct.Struct("<3d")
+_DELETE = struct.Struct("<I")
+
+class ConstructionDocument:
+    """A Construction driven by an operation journal, with undo/redo and binary save/load
+    
+    journal[i] is (op, payload): the added element for add operations, or the
+    journal index of the add being deleted for OP_DELETE. Entries past the cursor
+    are undone operations available for redo; recording a new operation drops them.
+    """
+    def __init__(self, snap_distance=15, exact=False):
+        self.construction = Construction(snap_distance, exact=exact)
+        self.journal = []
+        self.cursor = 0  # Number of journal entries currently applied
+        self.origin = {}  # id(element) -> journal index of the add that created it
+        self.live = set()  # Journal indices of adds whose element is currently present
+    
+    def _apply(self, index):
+        op, payload = self.journal[index]
+        if op == OP_DELETE:
+            self.construction.remove_element(self.journal[payload][1])
+            self.live.discard(payload)
+        else:
+            self._add(op, payload)
+            self.live.add(index)
+    
+    def _revert(self, index):
+        op, payload = self.journal[index]
+        if op == OP_DELETE:
+            self._add(*self.journal[payload])
+            self.live.add(payload)
+        else:
+            self.construction.remove_element(payload)
+            self.live.discard(index)
+    
+    def _add(self, op, element):
+        if op == OP_ADD_LINE:
+            self.construction.add_line(element)
+        else:
+            self.construction.add_circle(element)
+    
+    def _record(self, op, payload):
+        for op_dropped, payload_dropped in self.journal[self.cursor:]:
+            if op_dropped != OP_DELETE:
+                del self.origin[id(payload_dropped)]
+        del self.journal[self.cursor:]
+        
+        self.journal.append((op, payload))
+        if op != OP_DELETE:
+            self.origin[id(payload)] = self.cursor
+        self._apply(self.cursor)
+        self.cursor += 1
+    
+    def add_line(self, line):
+        self._record(OP_ADD_LINE, line)
+    
+    def add_circle(self, circle):
+        self._record(OP_ADD_CIRCLE, circle)
+    
+    def delete(self, element):
+        """Delete a line or circle; return False if it is not in the construction"""
+        index = self.origin.get(id(element))
+        if index is None or index not in self.live:
+            return False
+        self._record(OP_DELETE, index)
+        return True
+    
+    def replace_element(self, old, new):
+        """Give an added element new geometry in place (used when dragging derived elements)
+        
+        The add entry's payload is updated instead of journaling a delete/add pair,
+        so undo, redo and save all see the latest geometry. Returns False if the
+        element is unknown, e.g. its add was undone and then dropped from the journal.
+        """
+        index = self.origin.pop(id(old), None)
+        if index is None:
+            return False
+        op, _ = self.journal[index]
+        self.journal[index] = (op, new)
+        self.origin[id(new)] = index
+        if index in self.live:
+            self.construction.replace_element(old, new)
+        return True
+    
+    def can_undo(self):
+        return self.cursor > 0
+    
+    def can_redo(self):
+        return self.cursor < len(self.journal)
+    
+    def undo(self):
+        """Revert the last applied operation; return False if there is nothing to undo"""
+        if not self.can_undo():
+            return False
+        self.cursor -= 1
+        self._revert(self.cursor)
+        return True
+    
+    def redo(self):
+        """Re-apply the next undone operation; return False if there is nothing to redo"""
+        if not self.can_redo():
+            return False
+        self._apply(self.cursor)
+        self.cursor += 1
+        return True
+    
+    def replay(self):
+        """Rebuild the construction from the journal one operation at a time
+        
+        Yields each (op, payload) after it has been applied, e.g. for playback.
+        """
+        applied = self.cursor
+        old = self.construction
+        self.construction = Construction(old.snap_distance, old.intersections.epsilon, old.exact)
+        self.live = set()
+        self.cursor = 0
+        while self.cursor < applied:
+            self._apply(self.cursor)
+            self.cursor += 1
+            yield self.journal[self.cursor - 1]
+    
+    def to_bytes(self):
+        """Serialize the applied part of the journal (undone operations are not saved)"""
+        parts = [_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.cursor)]
+        for op, payload in self.journal[:self.cursor]:
+            parts.append(_OPCODE.pack(op))
+            if op == OP_ADD_LINE:
+                (x1, y1), (x2, y2) = payload
+                parts.append(_LINE.pack(x1, y1, x2, y2))
+            elif op == OP_ADD_CIRCLE:
+                (cx, cy), r = payload
+                parts.append(_CIRCLE.pack(cx, cy, r))
+            else:
+                parts.append(_DELETE.pack(payload))
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data, snap_distance=15, exact=False):
+        """Load a journal and build the final construction in one batch pass"""
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError("Not a construction file")
+        if version > FILE_VERSION:
+            raise ValueError(f"Unsupported construction file version: {version}")
+        
+        document = cls(snap_distance, exact)
+        offset = _HEADER.size
+        for index in range(count):
+            (op,) = _OPCODE.unpack_from(data, offset)
+            offset += _OPCODE.size
+            if op == OP_ADD_LINE:
+                x1, y1, x2, y2 = _LINE.unpack_from(data, offset)
+                payload = ((x1, y1), (x2, y2))
+                offset += _LINE.size
+            elif op == OP_ADD_CIRCLE:
+                cx, cy, r = _CIRCLE.unpack_from(data, offset)
+                payload = ((cx, cy), r)
+                offset += _CIRCLE.size
+            elif op == OP_DELETE:
+                (payload,) = _DELETE.unpack_from(data, offset)
+                offset += _DELETE.size
+                if payload >= index or payload not in document.live:
+                    raise ValueError("Corrupt construction file: delete of a missing element")
+            else:
+                raise ValueError(f"Corrupt construction file: unknown operation {op}")
+            
+            document.journal.append((op, payload))
+            if op == OP_DELETE:
+                document.live.discard(payload)
+            else:
+                document.origin[id(payload)] = index
+                document.live.add(index)
+        
+        # Add the surviving elements directly, then resolve intersections once
+        construction = document.construction
+        for index in sorted(document.live):
+            op, element = document.journal[index]
+            (construction.lines if op == OP_ADD_LINE else construction.circles).append(element)
+        construction.find_all_intersections(vectorized=np is not None and not exact)
+        document.cursor = count
+        return document
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+    
+    @classmethod
+    def load(cls, path, snap_distance=15, exact=False):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read(), snap_distance, exact)
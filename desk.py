@@ -5,8 +5,13 @@ import webbrowser
 import subprocess
 import random
 import sqlite3
+import threading
+import queue
+from collections import OrderedDict
 from typing import List, Dict, Tuple
 
+from frame_profiler import FrameProfiler, TRACE_ENV
+
 # 初始化Pygame
 pygame.init()
 pygame.font.init()
@@ -45,19 +50,295 @@ COLORS = {
     "info": (255, 255, 255)  # 信息文本颜色
 }
 
-class CardDatabaseConnection:
-    """数据库连接管理器"""
+UPCOMING_CARDS = 5  # 抽卡牌堆预先选定并预取详情的卡牌数
+DECK_PAGE_SIZE = 500  # 后台分页加载牌堆时每页的行数
+TEXT_CACHE_SIZE = 1024  # 文字渲染缓存的条目上限
+CARD_CACHE_BYTES = 32 << 20  # 预渲染卡牌表面缓存的内存上限（字节）
+CARD_MARGIN = 5  # 卡牌表面四周为选中外框留出的边距
+LOADER_EVENT = pygame.event.custom_type()  # 后台加载线程送来结果时唤醒主循环
+CARD_MOVE_MS = 300  # 卡牌移动动画时长（毫秒）
+FLASH_MS = 170  # 牌堆闪烁提示时长（毫秒）
+TRANSPARENT_KEY = (255, 0, 255)  # 预渲染表面的透明色（圆角不抗锯齿，用色键比逐像素透明快得多）
+
+class CardDatabase:
+    """长连接数据库管理器
+    
+    每个线程复用一个长连接（WAL 模式，开启预编译语句缓存），读取过的卡牌详情缓存在内存中。
+    fetch_details() 用一条 WHERE id IN (...) 查询批量读取，通常由 CardLoader 在后台线程调用，
+    绘制时只读缓存，不会因磁盘 I/O 卡住一帧。
+    """
+    IN_BATCH_SIZES = (1, 8, 64, 512)  # IN 列表补齐到固定长度，使同一条预编译语句可以反复使用
+    
     def __init__(self, db_path="cards.db"):
         self.db_path = db_path
+        self.local = threading.local()  # 每个线程自己的连接
+        self.connections = []  # 所有打开的连接，退出时统一关闭
+        self.lock = threading.Lock()
+        self.details = {}  # 卡牌 id -> 详细信息
+    
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=64, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                pass  # 只读文件或网络共享上无法启用 WAL，沿用默认日志模式
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+    
+    def title_page(self, after_id, limit):
+        """id 大于 after_id 的下一页 (id, 标题)，按 id 排序（键集分页，不用 OFFSET）"""
+        rows = self.connection().execute(
+            "SELECT id, title FROM cards WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+        return [(row["id"], row["title"]) for row in rows]
+    
+    def fetch_details(self, card_ids):
+        """批量查询卡牌详情，返回 {id: 详情}，不写入缓存（可在任意线程调用）"""
+        found = {}
+        missing = list(dict.fromkeys(card_ids))
+        conn = self.connection()
+        while missing:
+            size = next((n for n in self.IN_BATCH_SIZES if n >= len(missing)), self.IN_BATCH_SIZES[-1])
+            batch, missing = missing[:size], missing[size:]
+            params = batch + [batch[-1]] * (size - len(batch))  # 用最后一个 id 补齐
+            sql = f"SELECT * FROM cards WHERE id IN ({','.join('?' * size)})"
+            for row in conn.execute(sql, params):
+                found[row["id"]] = dict(row)
+        return found
+    
+    def prefetch(self, card_ids):
+        """同步批量读取尚未缓存的卡牌详情"""
+        self.details.update(self.fetch_details([card_id for card_id in card_ids if card_id not in self.details]))
+    
+    def cached(self, card_id):
+        """已缓存的详情，未读取时返回 None（不访问数据库）"""
+        return self.details.get(card_id)
+    
+    def get(self, card_id):
+        if card_id not in self.details:
+            self.prefetch([card_id])
+        return self.details[card_id]
+    
+    def close_connection(self):
+        """只关闭当前线程的连接，其他线程的连接不受影响"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            return
+        with self.lock:
+            self.connections.remove(conn)
+        conn.close()
+        self.local.conn = None
+    
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+        self.local = threading.local()
+
+card_db = CardDatabase()  # 首次查询时才连接
+
+class CardLoader:
+    """后台加载线程
+    
+    在工作线程上分页读取牌堆、预取卡牌详情，结果经线程安全的队列交给主循环，
+    由主循环在 pump() 中合并，游戏状态只在主线程修改。牌堆每页作为单独的任务排队，
+    中途提交的详情请求可以插在两页之间完成，不必等整个牌堆读完。
+    给出 wake_event 时每送出一个结果就投递该事件，让空闲时阻塞等待的主循环醒来。
+    工作线程退出时自己关闭它的数据库连接；close() 之后不再投递事件。
+    """
+    def __init__(self, db, wake_event=None):
+        self.db = db
+        self.wake_event = wake_event
+        self.requests = queue.Queue()  # 主线程 -> 工作线程：(任务类型, 参数)
+        self.results = queue.Queue()  # 工作线程 -> 主线程：(结果类型, 数据)
+        self.pending = set()  # 已请求、尚未送达的卡牌 id（仅主线程访问）
+        self.stopped = threading.Event()  # close() 已调用：工作线程不再取新任务、不再投递事件
+        self.thread = threading.Thread(target=self._run, name="card-loader", daemon=True)
+        self.thread.start()
+    
+    def load_deck(self):
+        self.requests.put(("deck", -1))
+    
+    def request_details(self, card_ids):
+        """请求预取详情；已缓存或已在途的 id 会被跳过"""
+        card_ids = [card_id for card_id in dict.fromkeys(card_ids)
+                    if card_id not in self.db.details and card_id not in self.pending]
+        if card_ids:
+            self.pending.update(card_ids)
+            self.requests.put(("details", card_ids))
+    
+    def _run(self):
+        try:
+            self._work()
+        finally:
+            self.db.close_connection()
+    
+    def _work(self):
+        while True:
+            kind, arg = self.requests.get()
+            if kind is None or self.stopped.is_set():
+                return
+            try:
+                if kind == "deck":
+                    page = self.db.title_page(arg, DECK_PAGE_SIZE)
+                    self.results.put(("titles", page))
+                    if len(page) == DECK_PAGE_SIZE:
+                        self.requests.put(("deck", page[-1][0]))  # 下一页排在已提交的请求之后
+                    else:
+                        self.results.put(("deck_done", None))
+                elif kind == "details":
+                    self.results.put(("details", (arg, self.db.fetch_details(arg))))
+            except sqlite3.Error as e:
+                self.results.put(("error", e))
+            if self.wake_event is not None and not self.stopped.is_set():
+                try:
+                    pygame.event.post(pygame.event.Event(self.wake_event))
+                except pygame.error:
+                    pass  # 主线程已经退出 pygame，没人等这个事件了
+    
+    def poll(self):
+        """取出所有已完成的结果，不阻塞"""
+        while True:
+            try:
+                yield self.results.get_nowait()
+            except queue.Empty:
+                return
+    
+    def close(self):
+        """停止工作线程；返回它是否已在超时前退出（未退出时它结束当前查询后自行退出）"""
+        self.stopped.set()
+        self.requests.put((None, None))
+        self.thread.join(timeout=1)
+        return not self.thread.is_alive()
+
+def linear(t):
+    return t
+
+def ease_out_cubic(t):
+    """先快后慢，接近终点时减速"""
+    return 1 - (1 - t) ** 3
+
+class Tween:
+    """把对象的一个属性在一段时间内从 start 过渡到 end（数值或等长元组）"""
+    __slots__ = ("target", "attr", "start", "end", "start_time", "duration", "easing", "on_done")
+    
+    def __init__(self, target, attr, start, end, start_time, duration, easing, on_done):
+        self.target = target
+        self.attr = attr
+        self.start = start
+        self.end = end
+        self.start_time = start_time
+        self.duration = duration
+        self.easing = easing
+        self.on_done = on_done
+    
+    def value(self, t):
+        e = self.easing(t)
+        if isinstance(self.start, tuple):
+            return tuple(a + (b - a) * e for a, b in zip(self.start, self.end))
+        return self.start + (self.end - self.start) * e
+
+class TweenScheduler:
+    """按时间推进的补间动画调度器
+    
+    进度由经过的毫秒数决定，掉帧不会拖慢动画。update() 每帧一次推进所有补间，
+    写入属性值，结束的补间自动移除并调用 on_done。每个 (对象, 属性) 同时只有一个补间，
+    新补间替换旧的。attr 为 None 的补间不写属性，只用作定时器。
+    """
+    def __init__(self):
+        self.tweens = {}  # (id(对象), 属性) -> Tween
+    
+    def __bool__(self):
+        return bool(self.tweens)
+    
+    def add(self, target, attr, start, end, duration, easing=ease_out_cubic, on_done=None, now=None):
+        if now is None:
+            now = pygame.time.get_ticks()
+        self.tweens[(id(target), attr)] = Tween(target, attr, start, end, now, duration, easing, on_done)
+    
+    def after(self, target, delay, callback, now=None):
+        """delay 毫秒后调用 callback（同一对象再次调用会重新计时）"""
+        self.add(target, None, None, None, delay, linear, callback, now)
+    
+    def cancel(self, target, attr):
+        self.tweens.pop((id(target), attr), None)
+    
+    def update(self, now):
+        finished = []
+        for key, tween in self.tweens.items():
+            t = min(1.0, (now - tween.start_time) / tween.duration) if tween.duration > 0 else 1.0
+            if tween.attr is not None:
+                setattr(tween.target, tween.attr, tween.value(t))
+            if t >= 1.0:
+                finished.append(key)
+        for key in finished:
+            tween = self.tweens.pop(key)
+            if tween.on_done is not None:
+                tween.on_done()
+
+tweens = TweenScheduler()
+
+def _keyed_surface(size):
+    """以 TRANSPARENT_KEY 为透明色的空白表面（有显示窗口时转换为屏幕格式）"""
+    surface = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    surface.fill(TRANSPARENT_KEY)
+    surface.set_colorkey(TRANSPARENT_KEY, pygame.RLEACCEL)
+    return surface
+
+class TextCache:
+    """所有字体共用的文字表面缓存（LRU）
+    
+    键为 (字体, 文字, 颜色)；同一段文字只渲染一次，之后每帧直接复用。
+    """
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+    
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = self.surfaces[key] = font.render(text, True, color)
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surf
+
+text_cache = TextCache()
+
+class CardSurfaceCache:
+    """预渲染的卡牌表面（LRU，按像素内存设上限）
     
-    def __enter__(self):
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row
-        return self.conn.cursor()
+    键包含卡牌 id、悬停/选中状态、显示的文字和配色，任一项变化都会渲染新的表面，
+    旧表面留在缓存中直到被淘汰，因此悬停来回切换也不会重复渲染。
+    """
+    def __init__(self, max_bytes=CARD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.surfaces = OrderedDict()
     
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.conn.commit()
-        self.conn.close()
+    def get(self, card, summary):
+        key = (card.id, card.hover, card.selected, card.title, summary, tuple(COLORS.values()))
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = self.surfaces[key] = card.render_surface(summary)
+        self.size += surf.get_width() * surf.get_height() * surf.get_bytesize()
+        while self.size > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.size -= old.get_width() * old.get_height() * old.get_bytesize()
+        return surf
+
+card_cache = CardSurfaceCache()
 
 class Card:
     def __init__(self, card_id: int, title: str):
@@ -68,15 +349,13 @@ class Card:
         self.hover = False
         self.selected = False
         self.visible = True
-        self.animation_pos = None  # 用于移动动画
+        self.animation_pos = None  # 移动动画中的当前绘制位置（由 tweens 推进），None 表示停在 pos
     
     @property
     def details(self) -> Dict[str, any]:
-        """延迟加载卡牌详细信息"""
+        """延迟加载卡牌详细信息（优先使用批量预取的缓存）"""
         if self._details is None:
-            with CardDatabaseConnection() as cursor:
-                cursor.execute("SELECT * FROM cards WHERE id = ?", (self.id,))
-                self._details = dict(cursor.fetchone())
+            self._details = card_db.get(self.id)
         return self._details
     
     @property
@@ -91,20 +370,40 @@ class Card:
     def target(self) -> str:
         return self.details["target"]
 
+    def screen_rect(self):
+        """本帧绘制占用的屏幕区域（含选中外框，动画中的小数坐标多留 1 像素）"""
+        x, y = self.animation_pos or self.pos
+        return pygame.Rect(int(x) - CARD_MARGIN, int(y) - CARD_MARGIN,
+                           CARD_WIDTH + CARD_MARGIN * 2 + 1, CARD_HEIGHT + CARD_MARGIN * 2 + 1)
+
+    def move_to(self, target):
+        """从当前绘制位置动画移动到 target"""
+        tweens.add(self, "animation_pos", self.animation_pos or self.pos, target, CARD_MOVE_MS,
+                   on_done=self._end_move)
+        self.pos = target
+
+    def _end_move(self):
+        self.animation_pos = None
+
+    def stop_moving(self):
+        tweens.cancel(self, "animation_pos")
+        self.animation_pos = None
+
+    def shown_summary(self):
+        """卡面上显示的摘要：详情尚未预取时为占位文字，不查询数据库"""
+        details = self._details or card_db.cached(self.id)
+        return details["summary"] if details else "加载中..."
+
     def draw(self, surface):
-        # 处理动画位置
-        if self.animation_pos:
-            pos = self.animation_pos
-            # 动画移动
-            self.animation_pos = (
-                pos[0] + (self.pos[0] - pos[0]) * 0.2,
-                pos[1] + (self.pos[1] - pos[1]) * 0.2
-            )
-            # 接近目标位置时结束动画
-            if abs(self.animation_pos[0] - self.pos[0]) < 2 and abs(self.animation_pos[1] - self.pos[1]) < 2:
-                self.animation_pos = None
-        else:
-            pos = self.pos
+        # 只读状态，不修改卡牌（动画由 tweens 推进）
+        pos = self.animation_pos or self.pos
+        summary = self.shown_summary()
+        surface.blit(card_cache.get(self, summary), (pos[0] - CARD_MARGIN, pos[1] - CARD_MARGIN))
+    
+    def render_surface(self, summary):
+        """把卡牌（含选中外框）渲染到一张色键透明的表面上，四周留 CARD_MARGIN 边距"""
+        surface = _keyed_surface((CARD_WIDTH + CARD_MARGIN * 2, CARD_HEIGHT + CARD_MARGIN * 2))
+        pos = (CARD_MARGIN, CARD_MARGIN)
         
         # 卡牌基础矩形
         rect = pygame.Rect(pos[0], pos[1], CARD_WIDTH, CARD_HEIGHT)
@@ -119,7 +418,7 @@ class Card:
         
         # 绘制标题（只显示一行，超出部分裁剪并加省略号）
         truncated_title = self.truncate_text(self.title, 12)  # 最多12字
-        title_surf = font_large.render(truncated_title, True, COLORS["title"])
+        title_surf = text_cache.render(font_large, truncated_title, COLORS["title"])
         title_rect = title_surf.get_rect(center=(pos[0] + CARD_WIDTH//2, pos[1] + 30))
         surface.blit(title_surf, title_rect)
         
@@ -133,9 +432,9 @@ class Card:
         
         # 绘制摘要（最多4行，超出部分裁剪）
         summary_y = pos[1] + 75
-        summary_lines = self.wrap_text(self.summary, 25)  # 每行最多25字
+        summary_lines = self.wrap_text(summary, 25)  # 每行最多25字
         for line in summary_lines[:4]:  # 只显示前4行
-            line_surf = font_small.render(line, True, COLORS["content"])
+            line_surf = text_cache.render(font_small, line, COLORS["content"])
             surface.blit(line_surf, (pos[0] + 20, summary_y))
             summary_y += 20
         
@@ -146,6 +445,7 @@ class Card:
                 (pos[0]-5, pos[1]-5, CARD_WIDTH+10, CARD_HEIGHT+10),
                 2, border_radius=10
             )
+        return surface
 
     def truncate_text(self, text, max_chars):
         """截断文本并添加省略号"""
@@ -223,51 +523,64 @@ class Deck:
         self.label = label
         self.cards = []  # 牌堆中的卡牌
         self.hover = False
-        self.flash = False  # 操作时的闪烁效果
-        self.flash_timer = 0
+        self.flash = False  # 操作时的闪烁效果，FLASH_MS 后由 tweens 关闭
+        self.bodies = {}  # 边框颜色 -> 预渲染的牌堆主体
     
     @property
     def remaining(self):
         return len(self.cards)
 
-    def draw(self, surface):
-        # 绘制牌堆基础
-        deck_rect = pygame.Rect(self.pos[0], self.pos[1], 150, 200)
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], 150, 200)
+
+    def state(self):
+        """影响外观的状态，变化时需要重绘"""
+        return (self.hover, self.flash, self.remaining, self.color)
+
+    def start_flash(self):
+        self.flash = True
+        tweens.after(self, FLASH_MS, self._end_flash)
+
+    def _end_flash(self):
+        self.flash = False
+
+    def _body(self, border_color):
+        """牌堆主体、叠层和边框，每种边框颜色只渲染一次"""
+        body = self.bodies.get((self.color, border_color))
+        if body is not None:
+            return body
+        body = _keyed_surface((150, 200))
+        deck_rect = pygame.Rect(0, 0, 150, 200)
         
         # 牌堆主体（添加纹理效果）
-        pygame.draw.rect(surface, self.color, deck_rect, border_radius=8)
+        pygame.draw.rect(body, self.color, deck_rect, border_radius=8)
         
         # 绘制牌堆叠层效果
         for i in range(5):
             offset = i * 3
-            layer_rect = pygame.Rect(
-                self.pos[0] + offset, self.pos[1] + offset, 
-                150 - offset*2, 200 - offset*2
-            )
+            layer_rect = pygame.Rect(offset, offset, 150 - offset*2, 200 - offset*2)
             r, g, b = self.color
             layer_color = (min(r + i*10, 200), min(g + i*5, 150), min(b + i*5, 100))
-            pygame.draw.rect(surface, layer_color, layer_rect, border_radius=8)
+            pygame.draw.rect(body, layer_color, layer_rect, border_radius=8)
         
         # 绘制边框（根据状态变化）
+        pygame.draw.rect(body, border_color, deck_rect, 3, border_radius=8)
+        self.bodies[(self.color, border_color)] = body
+        return body
+
+    def draw(self, surface):
         border_color = COLORS["border_hover"] if self.hover or self.flash else COLORS["border"]
-        pygame.draw.rect(surface, border_color, deck_rect, 3, border_radius=8)
+        surface.blit(self._body(border_color), self.pos)
         
         # 绘制剩余卡牌数
-        count_surf = font_large.render(f"剩余: {self.remaining}", True, (255, 255, 255))
+        count_surf = text_cache.render(font_large, f"剩余: {self.remaining}", (255, 255, 255))
         count_rect = count_surf.get_rect(center=(self.pos[0] + 75, self.pos[1] + 80))
         surface.blit(count_surf, count_rect)
         
         # 绘制提示文字
-        hint_surf = font_medium.render(self.label, True, (255, 255, 255))
+        hint_surf = text_cache.render(font_medium, self.label, (255, 255, 255))
         hint_rect = hint_surf.get_rect(center=(self.pos[0] + 75, self.pos[1] + 140))
         surface.blit(hint_surf, hint_rect)
-        
-        # 更新闪烁效果
-        if self.flash:
-            self.flash_timer += 1
-            if self.flash_timer > 10:
-                self.flash = False
-                self.flash_timer = 0
 
     def is_clicked(self, pos):
         deck_rect = pygame.Rect(self.pos[0], self.pos[1], 150, 200)
@@ -277,21 +590,35 @@ class DrawDeck(Deck):
     """抽卡牌堆"""
     def __init__(self):
         super().__init__(DECK_POS, COLORS["deck"], "功能卡")
-        self._load_all_cards()
+        self.upcoming = []  # 预先随机选定的下几张卡牌，由后台线程预取详情
+        self.loading = True  # 后台仍在分页加载牌堆
+    
+    @property
+    def remaining(self):
+        return len(self.cards) + len(self.upcoming)
+    
+    def add_cards(self, page):
+        """并入后台加载的一页 (id, 标题)"""
+        self.cards.extend(page)
+        self._pick_upcoming()
     
-    def _load_all_cards(self):
-        """从数据库加载所有卡牌的ID和标题"""
-        with CardDatabaseConnection() as cursor:
-            cursor.execute("SELECT id, title FROM cards")
-            self.cards = [(row["id"], row["title"]) for row in cursor.fetchall()]
+    def _pick_upcoming(self):
+        """补足预选卡牌"""
+        while len(self.upcoming) < UPCOMING_CARDS and self.cards:
+            self.upcoming.append(self.cards.pop(random.randint(0, len(self.cards) - 1)))
     
     def draw_card(self):
         """从牌堆中抽取一张卡牌"""
         if self.remaining == 0:
             return None
-        index = random.randint(0, self.remaining - 1)
-        card_id, title = self.cards.pop(index)
-        self.flash = True  # 抽卡时闪烁提示
+        # 预选卡牌只从已加载的部分选出；加载期间改为在全部已加载卡牌中重新随机，保持均匀
+        if self.loading:
+            self.cards.extend(self.upcoming)
+            self.upcoming.clear()
+            self._pick_upcoming()
+        card_id, title = self.upcoming.pop(0)
+        self._pick_upcoming()
+        self.start_flash()  # 抽卡时闪烁提示
         return Card(card_id, title)
 
 class DiscardPile(Deck):
@@ -301,18 +628,17 @@ class DiscardPile(Deck):
     
     def add_card(self, card):
         """添加卡牌到弃牌堆"""
-        # 记录当前位置作为动画起点
-        card.animation_pos = (card.pos[0], card.pos[1])
-        # 设置目标位置为弃牌堆位置
+        # 入堆的卡牌不绘制，直接放到弃牌堆位置；取回时从这里飞回桌面
+        card.stop_moving()
         card.pos = (self.pos[0] + 75 - CARD_WIDTH//2, self.pos[1] + 100 - CARD_HEIGHT//2)
         self.cards.append(card)
-        self.flash = True  # 添加入堆时闪烁提示
+        self.start_flash()  # 添加入堆时闪烁提示
     
     def take_card(self):
         """从弃牌堆取出最后一张卡牌"""
         if self.remaining == 0:
             return None
-        self.flash = True
+        self.start_flash()
         return self.cards.pop()
 
 class CardGame:
@@ -332,6 +658,12 @@ class CardGame:
         self.show_help = False  # 默认不显示帮助信息
         self.max_visible_cards = self.calculate_max_visible_cards()  # 计算最大可见卡牌数
         self.target_swap_index = None  # 用于记录拖拽交换位置的目标索引
+        self.profiler = FrameProfiler(trace_path=os.environ.get(TRACE_ENV))  # F3 显示帧耗时
+        self.loader = CardLoader(card_db, LOADER_EVENT)  # 牌堆在后台分页加载，界面立即可用
+        self.scene = {}  # 上次绘制时各元素的 (屏幕矩形, 外观状态)
+        self.full_redraw = True  # 下一帧整屏重绘（首帧、窗口重新显示、切换帧耗时面板）
+        self.hud_rect = None
+        self.loader.load_deck()
 
     def calculate_max_visible_cards(self):
         """计算屏幕上能显示的最大卡牌数量"""
@@ -385,21 +717,28 @@ class CardGame:
             if target_y + CARD_HEIGHT > SCREEN_HEIGHT - 50:
                 continue  # 超出屏幕范围则不调整
             
-            # 如果卡牌没有动画且位置不同，设置动画
-            if not card.animation_pos and (abs(card.pos[0] - target_x) > 5 or abs(card.pos[1] - target_y) > 5):
-                card.animation_pos = (card.pos[0], card.pos[1])
-            
-            # 设置目标位置
-            card.pos = (target_x, target_y)
+            # 目标变化时从当前绘制位置开始动画（动画中途换目标也一样），很小的偏移直接到位
+            if card.pos != (target_x, target_y):
+                if card.animation_pos or abs(card.pos[0] - target_x) > 5 or abs(card.pos[1] - target_y) > 5:
+                    card.move_to((target_x, target_y))
+                else:
+                    card.pos = (target_x, target_y)
 
-    def handle_events(self):
+    def handle_events(self, events):
         current_time = pygame.time.get_ticks()
         mouse_pos = pygame.mouse.get_pos()
         
-        for event in pygame.event.get():
+        for event in events:
+            if self.profiler.handle_event(event):
+                self.full_redraw = True
+                continue
+            
             if event.type == pygame.QUIT:
                 self.running = False
             
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.full_redraw = True
+            
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False  # ESC键退出
@@ -428,7 +767,7 @@ class CardGame:
         
         # 处理拖动
         if self.dragging_card:
-            self.dragging_card.animation_pos = None  # 拖动时取消动画
+            self.dragging_card.stop_moving()  # 拖动时取消动画
             self.dragging_card.pos = (
                 pos[0] - self.drag_offset[0],
                 pos[1] - self.drag_offset[1]
@@ -548,14 +887,11 @@ class CardGame:
         pygame.draw.rect(self.screen, (40, 120, 70), info_bar)
         
         # 绘制标题
-        title_surf = font_large.render("卡牌桌面", True, (255, 255, 255))
+        title_surf = text_cache.render(font_large, "卡牌桌面", (255, 255, 255))
         self.screen.blit(title_surf, (30, 10))
         
         # 绘制状态栏
-        status_surf = font_medium.render(
-            f"ESC: 退出 | 牌堆: {self.draw_deck.remaining} | 已收: {self.discard_pile.remaining}", 
-            True, (255, 255, 255)
-        )
+        status_surf = text_cache.render(font_medium, self._status_text(), (255, 255, 255))
         self.screen.blit(status_surf, (SCREEN_WIDTH - status_surf.get_width() - 30, 15))
         
         # 绘制牌堆
@@ -566,14 +902,103 @@ class CardGame:
         for card in self.table_cards:
             card.draw(self.screen)
         
-        pygame.display.flip()
+        if self.profiler.draw_hud(self.screen):
+            self.hud_rect = self.profiler.hud_surface.get_rect(topleft=(10, 60))
+
+    def _status_text(self):
+        return f"ESC: 退出 | F3: 帧耗时 | 牌堆: {self.draw_deck.remaining} | 已收: {self.discard_pile.remaining}"
+
+    def _scene(self):
+        """各可见元素的 (屏幕矩形, 外观状态)"""
+        scene = {
+            "info_bar": (pygame.Rect(0, 0, SCREEN_WIDTH, 50), self._status_text()),
+            "draw_deck": (self.draw_deck.rect(), self.draw_deck.state()),
+            "discard_pile": (self.discard_pile.rect(), self.discard_pile.state()),
+        }
+        for index, card in enumerate(self.table_cards):
+            scene[("card", id(card))] = (card.screen_rect(), (index, card.hover, card.selected, card.shown_summary()))
+        return scene
+
+    def _dirty_rects(self):
+        """与上次绘制相比外观或位置有变化的区域（新旧位置都要重绘）"""
+        scene = self._scene()
+        if self.full_redraw:
+            self.full_redraw = False
+            rects = [self.screen.get_rect()]
+        else:
+            rects = []
+            for key in scene.keys() | self.scene.keys():
+                old, new = self.scene.get(key), scene.get(key)
+                if old != new:
+                    rects.extend(item[0] for item in (old, new) if item is not None)
+            if rects and self.profiler.show_hud and self.hud_rect is not None:
+                rects.append(self.hud_rect)  # 面板半透明，只要绘制就一起刷新
+        self.scene = scene
+        return rects
+
+    def _redraw(self, rects):
+        """只在脏区域的并集内重绘"""
+        clip = rects[0].unionall(rects[1:])
+        self.screen.set_clip(clip)
+        self.draw()
+        self.screen.set_clip(None)
+        if self.profiler.show_hud and self.hud_rect is not None and not clip.contains(self.hud_rect):
+            self.full_redraw = True  # 面板变大超出了本次重绘区域
+
+    def _busy(self):
+        """是否有动画或闪烁需要继续逐帧推进"""
+        return self.full_redraw or bool(tweens)
+
+    def _next_events(self):
+        """有动画时直接取事件；空闲时阻塞等待，直到有输入或后台加载结果"""
+        if self._busy():
+            return pygame.event.get()
+        return [pygame.event.wait()] + pygame.event.get()
+
+    def _pump_loader(self):
+        """合并后台线程送来的结果，并为接下来可能显示的卡牌请求详情"""
+        for kind, data in self.loader.poll():
+            if kind == "titles":
+                self.draw_deck.add_cards(data)
+            elif kind == "deck_done":
+                self.draw_deck.loading = False
+            elif kind == "details":
+                requested, found = data
+                card_db.details.update(found)
+                self.loader.pending.difference_update(requested)
+            elif kind == "error":
+                print(f"加载卡牌失败: {data}")
+        # 桌面上尚无详情的卡牌，以及接下来要抽出的卡牌
+        self.loader.request_details([card.id for card in self.table_cards if card._details is None]
+                                    + [card_id for card_id, _ in self.draw_deck.upcoming])
 
     def run(self):
+        # 分阶段计时：事件、布局、绘制、翻转（设置 FRAME_TRACE 环境变量可导出逐帧记录）
+        profiler = self.profiler
+        # 只在有输入、动画或闪烁时重绘，并且只刷新变化的区域；空闲时不占用 CPU
         while self.running:
-            self.handle_events()
-            self._arrange_table_cards()
-            self.draw()
+            events = self._next_events()
+            profiler.begin_frame()
+            with profiler.phase("events"):
+                self.handle_events(events)
+            with profiler.phase("layout"):
+                self._pump_loader()
+                self._arrange_table_cards()
+                tweens.update(pygame.time.get_ticks())  # 一次推进所有动画
+                dirty = self._dirty_rects()
+            with profiler.phase("draw"):
+                if dirty:
+                    self._redraw(dirty)
+            with profiler.phase("flip"):
+                if dirty:
+                    pygame.display.update(dirty)
+            profiler.end_frame()
             self.clock.tick(60)
+        profiler.dump()
+        if self.loader.close():
+            card_db.close()
+        else:
+            card_db.close_connection()  # 工作线程还在查询中，它的连接由它退出时自己关闭
 
 if __name__ == "__main__":
     # 检查数据库是否存在
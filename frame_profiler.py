@@ -0,0 +1,119 @@
+﻿import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pygame
+
+PHASES = ("events", "layout", "draw", "flip")
+TRACE_ENV = "FRAME_TRACE"  # Set to a .csv/.json path to record a per-frame trace
+
+class FrameProfiler:
+    """Per-phase frame timing for the pygame main loops
+    
+    Wrap each part of a frame in `with profiler.phase(name):` between
+    begin_frame() and end_frame(). The last `history` frames are kept for rolling
+    percentiles; with a trace_path every frame is also kept and written there by
+    dump() (CSV, or JSON for a .json path). Phases not run in a frame count as 0 ms.
+    """
+    def __init__(self, phases=PHASES, history=300, trace_path=None, hud_key=pygame.K_F3):
+        self.phases = list(phases)
+        self.samples = {name: deque(maxlen=history) for name in self.phases + ["frame"]}
+        self.trace_path = trace_path
+        self.trace = [] if trace_path else None
+        self.hud_key = hud_key
+        self.show_hud = False
+        self.frame_index = 0
+        self.current = None  # Phase durations (ms) of the frame being timed
+        self.frame_start = 0.0
+        self.hud_surface = None
+        self.hud_age = 0  # Frames since the HUD text was last rendered
+        self.hud_font = None
+    
+    def begin_frame(self):
+        self.current = dict.fromkeys(self.phases, 0.0)
+        self.frame_start = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                self.current[name] = self.current.get(name, 0.0) + (time.perf_counter() - start) * 1000
+    
+    def end_frame(self):
+        """Close the frame started by begin_frame(); return its total time in ms"""
+        total = (time.perf_counter() - self.frame_start) * 1000
+        for name in self.phases:
+            self.samples[name].append(self.current.get(name, 0.0))
+        self.samples["frame"].append(total)
+        if self.trace is not None:
+            row = {"frame": self.frame_index, "total": total}
+            row.update(self.current)
+            self.trace.append(row)
+        self.frame_index += 1
+        self.current = None
+        return total
+    
+    def percentiles(self, name, qs=(50, 95, 99)):
+        """Nearest-rank percentiles (ms) of a phase over the rolling window"""
+        values = sorted(self.samples[name])
+        if not values:
+            return [0.0 for _ in qs]
+        last = len(values) - 1
+        return [values[min(last, int(round(q / 100 * last)))] for q in qs]
+    
+    def handle_event(self, event):
+        """Toggle the HUD on its key; return True if the event was consumed"""
+        if event.type == pygame.KEYDOWN and event.key == self.hud_key:
+            self.show_hud = not self.show_hud
+            self.hud_surface = None
+            return True
+        return False
+    
+    def draw_hud(self, surface, pos=(10, 60), refresh=15):
+        """Blit the timing overlay if it is enabled; return the rect drawn or None
+        
+        The text is only re-rendered every `refresh` frames so the HUD itself
+        stays out of the numbers it reports.
+        """
+        if not self.show_hud:
+            return None
+        self.hud_age += 1
+        if self.hud_surface is None or self.hud_age >= refresh:
+            self.hud_surface = self._render_hud()
+            self.hud_age = 0
+        return surface.blit(self.hud_surface, pos)
+    
+    def _render_hud(self):
+        if self.hud_font is None:
+            self.hud_font = pygame.font.SysFont("Consolas, Courier New, monospace", 14)
+        lines = [f"{'phase':<8}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name in self.phases + ["frame"]:
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f"{name:<8}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}")
+        rendered = [self.hud_font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self.hud_font.get_linesize()
+        width = max(text.get_width() for text in rendered) + 12
+        hud = pygame.Surface((width, line_height * len(rendered) + 8))
+        hud.fill((0, 0, 0))
+        hud.set_alpha(190)
+        for i, text in enumerate(rendered):
+            hud.blit(text, (6, 4 + i * line_height))
+        return hud
+    
+    def dump(self, path=None):
+        """Write the per-frame trace as CSV, or JSON if path ends in .json; no-op without a trace"""
+        path = path or self.trace_path
+        if self.trace is None or not path:
+            return
+        with open(path, 'w', newline='') as f:
+            if path.lower().endswith(".json"):
+                json.dump(self.trace, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=["frame", "total"] + self.phases, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(self.trace)
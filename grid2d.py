@@ -1,32 +1,15 @@
-﻿import pygame
-import random
-import win32com.client as win32
-import math
-import os
-import json
-from tkinter import Tk
-from tkinter.filedialog import asksaveasfilename, askopenfilename
+﻿import os
+import argparse
 
-# Initialize Pygame
-pygame.init()
+import pygame
 
-# Get screen dimensions
-info = pygame.display.Info()
-WINDOW_WIDTH, WINDOW_HEIGHT = info.current_w, info.current_h
-
-# Create fullscreen window
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF)
-pygame.display.set_caption("Grid2D")
-
-# Cell size
-cell_size = 16
-
-# Calculate grid rows and columns
-rows = (WINDOW_HEIGHT // cell_size) * 2
-cols = (WINDOW_WIDTH // cell_size) * 2
-
-# Initialize grid
-grid = [[random.randint(0, 0) for _ in range(cols)] for _ in range(rows)]
+from frame_profiler import FrameProfiler, TRACE_ENV
+from grid2d_core import (
+    ChunkedGrid, MappedGrid, EditHistory, BRUSH_SQUARE, BRUSH_CIRCLE, stroke_spans,
+)
+from grid2d_render import GridRenderer
+from grid2d_file import save_g2d, open_grid
+from grid2d_sim import ChunkStepper, LIFE
 
 # Define colors
 WHITE = (255, 255, 255)
@@ -38,8 +21,8 @@ TEXT_COLOR = (40, 40, 40)
 ERASER_COLOR = (255, 100, 100)
 ERASER_HOVER = (255, 150, 150)
 
-# Camera offset
-camera_x, camera_y = 0, 0
+SCROLL_SPEED = 8  # Edge-scroll pixels per frame
+FILL_LIMIT = 1024  # Fill reaches at most this many cells from the click, even zoomed far out
 
 # Button class with improved visibility
 class Button:
@@ -69,133 +52,276 @@ class Button:
 
 # Save grid to file
 def save_grid(grid_data):
+    from tkinter import Tk  # Only the dialogs need tkinter; keep it out of imports and headless use
+    from tkinter.filedialog import asksaveasfilename
     root = Tk()
     root.withdraw()  # Hide the main window
     file_path = asksaveasfilename(defaultextension=".g2d", 
                                  filetypes=[("Grid2D Files", "*.g2d"), ("All Files", "*.*")])
     if file_path:
-        with open(file_path, 'w') as f:
-            json.dump(grid_data, f)
+        save_g2d(grid_data, file_path)
 
-# Load grid from file
+# Load grid from file: returns (grid, reader), reader streams in the chunks of binary files
 def load_grid():
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilename
     root = Tk()
     root.withdraw()  # Hide the main window
     file_path = askopenfilename(filetypes=[("Grid2D Files", "*.g2d"), ("All Files", "*.*")])
     if file_path:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return open_grid(file_path)
     return None
 
-# Create buttons with better layout
-button_width, button_height = 100, 40
-button_margin = 20
-buttons = []
-
-# Calculate total width needed for buttons
-total_buttons_width = 5 * button_width + 4 * button_margin
-start_x = (WINDOW_WIDTH - total_buttons_width) // 2
-
-# Create buttons in a centered row at the bottom
-button_y = WINDOW_HEIGHT - button_height - 20
-buttons.append(Button(start_x, button_y, button_width, button_height, "Draw"))
-buttons.append(Button(start_x + button_width + button_margin, button_y, button_width, button_height, "Erase", ERASER_COLOR, ERASER_HOVER))
-buttons.append(Button(start_x + 2*(button_width + button_margin), button_y, button_width, button_height, "Save"))
-buttons.append(Button(start_x + 3*(button_width + button_margin), button_y, button_width, button_height, "Load"))
-buttons.append(Button(start_x + 4*(button_width + button_margin), button_y, button_width, button_height, "Exit"))
-
-# Main game loop
-running = True
-drawing = False
-erasing = False
-clock = pygame.time.Clock()
-
-while running:
-    mouse_pos = pygame.mouse.get_pos()
-    mouse_buttons = pygame.mouse.get_pressed()
-
-    # Handle camera movement
-    if mouse_pos[0] < 50:
-        camera_x = max(camera_x - 1, 0)
-    if mouse_pos[0] > WINDOW_WIDTH - 50:
-        camera_x = min(camera_x + 1, cols - WINDOW_WIDTH // cell_size)
-    if mouse_pos[1] < 50:
-        camera_y = max(camera_y - 1, 0)
-    if mouse_pos[1] > WINDOW_HEIGHT - 50:
-        camera_y = min(camera_y + 1, rows - WINDOW_HEIGHT // cell_size)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                running = False
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:  # Left mouse button
-                for button in buttons:
-                    button.check_hover(mouse_pos)
-                    if button.is_hovered:
-                        if button.text == "Draw":
-                            drawing = True
-                            erasing = False
-                        elif button.text == "Erase":
-                            erasing = True
-                            drawing = False
-                        elif button.text == "Save":
-                            save_grid(grid)
-                        elif button.text == "Load":
-                            loaded_grid = load_grid()
-                            if loaded_grid:
-                                grid = loaded_grid
-                        elif button.text == "Exit":
-                            running = False
-
-    # Fill background with white
-    screen.fill(WHITE)
-
-    # Draw grid lines
-    for i in range(0, WINDOW_HEIGHT, cell_size):
-        pygame.draw.line(screen, LIGHT_GRAY, (0, i), (WINDOW_WIDTH, i), 1)
-    for j in range(0, WINDOW_WIDTH, cell_size):
-        pygame.draw.line(screen, LIGHT_GRAY, (j, 0), (j, WINDOW_HEIGHT), 1)
-
-    # Draw grid cells with correct camera offset
-    start_col = max(0, camera_x)
-    end_col = min(cols, camera_x + WINDOW_WIDTH // cell_size + 1)
-    start_row = max(0, camera_y)
-    end_row = min(rows, camera_y + WINDOW_HEIGHT // cell_size + 1)
-
-    for i in range(start_row, end_row):
-        for j in range(start_col, end_col):
-            if grid[i][j] == 1:
-                pygame.draw.rect(screen, DARK_GREEN,
-                               ((j - camera_x) * cell_size,
-                                (i - camera_y) * cell_size,
-                                cell_size, cell_size))
-
-    # Handle drawing and erasing
-    if mouse_buttons[0]:  # Left mouse button pressed
-        # Only draw/erase if not hovering over buttons
-        if not any(button.rect.collidepoint(mouse_pos) for button in buttons):
-            col = (mouse_pos[0] // cell_size) + camera_x
-            row = (mouse_pos[1] // cell_size) + camera_y
-            
-            if 0 <= row < rows and 0 <= col < cols:
-                if drawing:
-                    grid[row][col] = 1
-                elif erasing:
-                    grid[row][col] = 0
-
-    # Draw buttons
-    for button in buttons:
-        button.check_hover(mouse_pos)
-        button.draw(screen)
-
-    # Update display
-    pygame.display.flip()
-
-    # Control frame rate
-    clock.tick(60)
-
-# Quit Pygame
-pygame.quit()
\ No newline at end of file
+# Command line: optionally edit a memory-mapped grid file in place instead of an in-memory canvas
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grid2D")
+    parser.add_argument("--map", help="memory-mapped .g2m grid file to edit (created if missing)")
+    parser.add_argument("--size", nargs=2, type=int, default=[16384, 16384], metavar=("ROWS", "COLS"),
+                        help="grid size when creating a --map file")
+    parser.add_argument("--undo-mb", type=int, default=64, help="memory budget of the undo history in MB")
+    parser.add_argument("--rule", default=LIFE, help="cellular automaton rule for Space/N, e.g. B36/S23")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Initialize Pygame
+    pygame.init()
+
+    # Get screen dimensions
+    info = pygame.display.Info()
+    WINDOW_WIDTH, WINDOW_HEIGHT = info.current_w, info.current_h
+
+    # Create fullscreen window
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF)
+    pygame.display.set_caption("Grid2D")
+
+    # Zoom: each cell is 2**zoom pixels wide (16 px at 4); mouse wheel or +/- to change
+    zoom = 4
+
+    # Initialize grid: sparse chunks, so the canvas is unbounded and only painted areas use memory,
+    # or a mapped file where only the pages under the viewport are ever read
+    if args.map:
+        grid = MappedGrid(args.map) if os.path.exists(args.map) else MappedGrid.create(args.map, *args.size)
+    else:
+        grid = ChunkedGrid()
+
+    # Camera offset in cells; fractional, so scrolling moves by pixels rather than whole cells
+    camera_x, camera_y = 0.0, 0.0
+
+    renderer = GridRenderer(grid, zoom, DARK_GREEN, LIGHT_GRAY, WHITE)
+    stepper = ChunkStepper(grid, args.rule)
+    history = EditHistory(grid, args.undo_mb << 20)  # Ctrl+Z / Ctrl+Y; one step per stroke or fill
+
+    # Create buttons with better layout
+    button_width, button_height = 100, 40
+    button_margin = 20
+    buttons = []
+
+    # Calculate total width needed for buttons
+    total_buttons_width = 6 * button_width + 5 * button_margin
+    start_x = (WINDOW_WIDTH - total_buttons_width) // 2
+
+    # Create buttons in a centered row at the bottom
+    button_y = WINDOW_HEIGHT - button_height - 20
+    buttons.append(Button(start_x, button_y, button_width, button_height, "Draw"))
+    buttons.append(Button(start_x + button_width + button_margin, button_y, button_width, button_height, "Erase", ERASER_COLOR, ERASER_HOVER))
+    buttons.append(Button(start_x + 2*(button_width + button_margin), button_y, button_width, button_height, "Fill"))
+    buttons.append(Button(start_x + 3*(button_width + button_margin), button_y, button_width, button_height, "Save"))
+    buttons.append(Button(start_x + 4*(button_width + button_margin), button_y, button_width, button_height, "Load"))
+    buttons.append(Button(start_x + 5*(button_width + button_margin), button_y, button_width, button_height, "Exit"))
+
+    def screen_to_cell(pos):
+        return renderer.screen_to_cell(pos, camera_x, camera_y)
+
+    # Zoom keeping the point under pos in place
+    def zoom_at(pos, new_zoom):
+        nonlocal zoom, camera_x, camera_y
+        x, y = camera_x + pos[0] / renderer.cell_size, camera_y + pos[1] / renderer.cell_size
+        zoom = renderer.set_zoom(new_zoom)
+        camera_x, camera_y = x - pos[0] / renderer.cell_size, y - pos[1] / renderer.cell_size
+
+    # Main game loop
+    running = True
+    drawing = False
+    erasing = False
+    filling = False
+    brush_size = 1  # [ and ] change the brush size, B toggles square/circle
+    brush_shape = BRUSH_SQUARE
+    stroke_points = []  # Cells the mouse passed through since the last paint, from every motion event
+    last_stroke_cell = None  # End of the stroke painted so far, so the next segment joins it
+    stroke_ended = False
+    clock = pygame.time.Clock()
+    reader = None  # G2DReader still streaming chunks of the loaded file into grid
+    simulating = False  # Space runs the automaton one generation per frame, N steps once
+    step_once = False
+    profiler = FrameProfiler(("events", "edit", "sim", "draw", "flip"), trace_path=os.environ.get(TRACE_ENV))  # F3 toggles the HUD
+
+    while running:
+        profiler.begin_frame()
+        with profiler.phase("events"):
+            mouse_pos = pygame.mouse.get_pos()
+            mouse_buttons = pygame.mouse.get_pressed()
+
+            # Handle camera movement
+            if mouse_pos[0] < 50:
+                camera_x -= SCROLL_SPEED / renderer.cell_size
+            if mouse_pos[0] > WINDOW_WIDTH - 50:
+                camera_x += SCROLL_SPEED / renderer.cell_size
+            if mouse_pos[1] < 50:
+                camera_y -= SCROLL_SPEED / renderer.cell_size
+            if mouse_pos[1] > WINDOW_HEIGHT - 50:
+                camera_y += SCROLL_SPEED / renderer.cell_size
+
+            for event in pygame.event.get():
+                if profiler.handle_event(event):
+                    continue
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        running = False
+                    elif event.key == pygame.K_LEFTBRACKET:
+                        brush_size = max(1, brush_size - 1)
+                    elif event.key == pygame.K_RIGHTBRACKET:
+                        brush_size = min(64, brush_size + 1)
+                    elif event.key == pygame.K_b:
+                        brush_shape = BRUSH_CIRCLE if brush_shape == BRUSH_SQUARE else BRUSH_SQUARE
+                    elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                        zoom_at((WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2), zoom + 1)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        zoom_at((WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2), zoom - 1)
+                    elif event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        if event.mod & pygame.KMOD_SHIFT:
+                            history.redo()
+                        else:
+                            history.undo()
+                        stroke_points, last_stroke_cell = [], None
+                    elif event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        history.redo()
+                        stroke_points, last_stroke_cell = [], None
+                    elif event.key == pygame.K_SPACE:
+                        simulating = not simulating
+                    elif event.key == pygame.K_n:
+                        step_once = True
+                elif event.type == pygame.MOUSEWHEEL:
+                    zoom_at(pygame.mouse.get_pos(), zoom + event.y)
+                elif event.type == pygame.MOUSEMOTION:
+                    if event.buttons[0] and (last_stroke_cell is not None or stroke_points):
+                        stroke_points.append(screen_to_cell(event.pos))
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    if event.button == 1 and (last_stroke_cell is not None or stroke_points):
+                        stroke_points.append(screen_to_cell(event.pos))
+                        stroke_ended = True
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == 1 and not any(button.rect.collidepoint(event.pos) for button in buttons):
+                        if filling:
+                            # Bucket fill within the viewport: toggles the clicked cell's connected area
+                            row, col = screen_to_cell(event.pos)
+                            top, left, bottom, right = renderer.view_cells((WINDOW_WIDTH, WINDOW_HEIGHT), camera_x, camera_y)
+                            top, left = max(top, row - FILL_LIMIT), max(left, col - FILL_LIMIT)
+                            bottom, right = min(bottom, row + FILL_LIMIT + 1), min(right, col + FILL_LIMIT + 1)
+                            if reader is not None:  # Edits must land on the file's cells, not be replaced by them later
+                                reader.load_region(grid, top, left, bottom, right)
+                            history.flood_fill(row, col, 1 - grid.get(row, col), top, left, bottom, right)
+                            history.commit()
+                        elif drawing or erasing:
+                            stroke_points.append(screen_to_cell(event.pos))
+                    elif event.button == 1:  # Left mouse button
+                        for button in buttons:
+                            button.check_hover(mouse_pos)
+                            if button.is_hovered:
+                                if button.text == "Draw":
+                                    drawing = True
+                                    erasing = filling = False
+                                elif button.text == "Erase":
+                                    erasing = True
+                                    drawing = filling = False
+                                elif button.text == "Fill":
+                                    filling = True
+                                    drawing = erasing = False
+                                elif button.text == "Save":
+                                    if reader is not None:  # Finish a streaming load before saving
+                                        reader.load_all(grid)
+                                        reader.close()
+                                        reader = None
+                                    if isinstance(grid, MappedGrid):
+                                        grid.flush()  # Edits already live in the mapped file
+                                    else:
+                                        save_grid(grid)
+                                elif button.text == "Load":
+                                    loaded = load_grid()
+                                    if loaded is not None:
+                                        if reader is not None:
+                                            reader.close()
+                                        if isinstance(grid, MappedGrid):
+                                            grid.close()
+                                        grid, reader = loaded
+                                        renderer.set_grid(grid)
+                                        stepper = ChunkStepper(grid, args.rule)
+                                        history = EditHistory(grid, args.undo_mb << 20)
+                                elif button.text == "Exit":
+                                    running = False
+
+            # Stream in a binary file: the chunks in view at once, then more within a per-frame time budget
+            if reader is not None:
+                top, left, bottom, right = renderer.view_cells((WINDOW_WIDTH, WINDOW_HEIGHT), camera_x, camera_y)
+                if zoom >= 0:  # Zoomed out the view may cover the whole file; stream it instead
+                    reader.load_region(grid, top, left, bottom, right)
+                if not reader.load_some(grid, ((top + bottom) // 2, (left + right) // 2)):
+                    reader.close()
+                    reader = None
+
+        with profiler.phase("edit"):
+            # Handle drawing and erasing: join every point the mouse passed through this frame
+            # (plus the held position, for edge scrolling) and paint the brush along it in one batch
+            if mouse_buttons[0] and last_stroke_cell is not None and not stroke_points and not stroke_ended:
+                stroke_points.append(screen_to_cell(pygame.mouse.get_pos()))  # Read after the events were pumped
+            if stroke_points:
+                if last_stroke_cell is not None:
+                    stroke_points.insert(0, last_stroke_cell)
+                spans = stroke_spans(stroke_points, brush_size, brush_shape)
+                if reader is not None:  # Stream in the chunks under the brush first, at any zoom
+                    reader.load_region(grid, min(span[0] for span in spans), min(span[1] for span in spans),
+                                       max(span[0] for span in spans) + 1, max(span[2] for span in spans))
+                history.fill_spans(spans, 1 if drawing else 0)
+                last_stroke_cell = None if stroke_ended else stroke_points[-1]
+                stroke_points = []
+            elif stroke_ended:
+                last_stroke_cell = None
+            if stroke_ended:
+                history.commit()  # The whole stroke undoes as one step
+            stroke_ended = False
+
+        with profiler.phase("sim"):
+            # Advance the automaton once the whole file is in; only chunks near changes are recomputed
+            if (simulating or step_once) and reader is None:
+                stepper.step()
+            step_once = False
+
+        with profiler.phase("draw"):
+            # Background, cached grid lines and one pre-scaled Surface per visible chunk
+            renderer.draw(screen, camera_x, camera_y)
+
+            # Draw buttons
+            for button in buttons:
+                button.check_hover(mouse_pos)
+                button.draw(screen)
+            profiler.draw_hud(screen)
+
+        # Update display
+        with profiler.phase("flip"):
+            pygame.display.flip()
+        profiler.end_frame()
+
+        # Control frame rate
+        clock.tick(60)
+
+    # Quit Pygame
+    if isinstance(grid, MappedGrid):
+        grid.close()
+    profiler.dump()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
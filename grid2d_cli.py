@@ -0,0 +1,172 @@
+﻿import argparse
+import json
+import math
+import os
+import sys
+
+from grid2d_core import CHUNK_SIZE, ChunkedGrid, MappedGrid
+from grid2d_file import json_grid_data, load_grid_file, save_g2d
+from grid2d_sim import LIFE, run
+
+# Batch tool for grid files: nothing here needs a display, and pygame is only imported to render
+
+def load(path):
+    """Open a grid file: .g2m maps the file, anything else (.g2d binary or legacy JSON) loads into memory"""
+    if path.lower().endswith(".g2m"):
+        return MappedGrid(path)
+    return load_grid_file(path)
+
+def close(grid):
+    if isinstance(grid, MappedGrid):
+        grid.close()
+
+def to_chunked(grid):
+    """A ChunkedGrid with a copy of grid's cells"""
+    if isinstance(grid, ChunkedGrid):
+        return grid
+    copy = ChunkedGrid()
+    for key in grid.chunk_keys():
+        copy.set_chunk(key[0], key[1], bytearray(grid.get_chunk(*key)))
+    return copy
+
+def save(grid, path, size=None):
+    """Write a grid in the format its extension names: .g2m (mapped), .json (legacy) or binary .g2d"""
+    lower = path.lower()
+    if lower.endswith(".json"):
+        with open(path, 'w') as f:
+            json.dump(json_grid_data(to_chunked(grid)), f)
+    elif lower.endswith(".g2m"):
+        bounds = grid.bounds()
+        if bounds is not None and (bounds[0] < 0 or bounds[1] < 0):
+            raise ValueError(f"Cells at negative coordinates don't fit a mapped grid: bounds {bounds}")
+        if size is None:
+            size = (0, 0) if bounds is None else (bounds[2], bounds[3])
+        elif bounds is not None and (bounds[2] > size[0] or bounds[3] > size[1]):
+            raise ValueError(f"Cells outside a {size[0]}x{size[1]} mapped grid: bounds {bounds}")
+        mapped = MappedGrid.create(path, *size)
+        try:
+            for key in grid.chunk_keys():
+                mapped.set_chunk(key[0], key[1], bytes(grid.get_chunk(*key)))
+        finally:
+            mapped.close()
+    else:
+        save_g2d(grid, path)
+
+def grid_stats(grid):
+    bounds = grid.bounds()
+    cells = len(grid)
+    area = 0 if bounds is None else (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+    return {
+        "cells": cells,
+        "chunks": len(grid.chunk_keys()),
+        "bounds": bounds,
+        "density": cells / area if area else 0.0,
+    }
+
+def render_png(grid, path, zoom=None, region=None, max_size=4096):
+    """Render a region (default: the painted bounds) to a PNG; zoom defaults to the largest that fits max_size"""
+    import pygame  # Only rendering needs it
+    from grid2d_render import MAX_ZOOM, MIN_ZOOM, GridRenderer
+    
+    if region is None:
+        region = grid.bounds() or (0, 0, CHUNK_SIZE, CHUNK_SIZE)
+    top, left, bottom, right = region
+    if zoom is None:
+        extent = max(bottom - top, right - left, 1)
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, math.floor(math.log2(max_size / extent))))
+    scale = 2.0 ** zoom
+    surface = pygame.Surface((max(1, math.ceil((right - left) * scale)), max(1, math.ceil((bottom - top) * scale))))
+    renderer = GridRenderer(grid, zoom, (0, 180, 0), (220, 220, 220))
+    renderer.draw(surface, left, top)
+    while renderer.incomplete:  # Overview tiles are built over several draws
+        renderer.draw(surface, left, top)
+    pygame.image.save(surface, path)
+    return surface.get_size()
+
+def cmd_convert(args):
+    grid = load(args.source)
+    try:
+        save(grid, args.target, args.size)
+    finally:
+        close(grid)
+
+def cmd_render(args):
+    grid = load(args.source)
+    try:
+        width, height = render_png(grid, args.target, args.zoom, args.region, args.max_size)
+    finally:
+        close(grid)
+    print(f"{args.target}: {width}x{height}")
+
+def cmd_sim(args):
+    grid = load(args.source)
+    try:
+        stats = run(grid, args.steps, args.rule, args.engine, args.workers)
+        target = args.output or args.source
+        if isinstance(grid, MappedGrid) and target == args.source:
+            grid.flush()  # Stepped in place
+        else:
+            save(grid, target)
+    finally:
+        close(grid)
+    print(f"{stats['generations']} generations ({stats['engine']}) in {stats['seconds']:.3f}s, "
+          f"{stats['cells_per_second']:.3g} cells/s, population {stats['population']}")
+
+def cmd_stats(args):
+    for path in args.sources:
+        grid = load(path)
+        try:
+            row = {"path": path, "bytes": os.path.getsize(path)}
+            row.update(grid_stats(grid))
+        finally:
+            close(grid)
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print(f"{path}: {row['cells']} cells in {row['chunks']} chunks, bounds {row['bounds']}, "
+                  f"density {row['density']:.4f}, {row['bytes']} bytes")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch operations on Grid2D files (.g2d, legacy JSON, .g2m)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    convert = commands.add_parser("convert", help="rewrite a grid in the format of the target's extension")
+    convert.add_argument("source")
+    convert.add_argument("target", help=".g2d (binary), .json (legacy) or .g2m (mapped)")
+    convert.add_argument("--size", nargs=2, type=int, metavar=("ROWS", "COLS"),
+                         help="size of a .g2m target (default: just fits the cells)")
+    convert.set_defaults(func=cmd_convert)
+    
+    render = commands.add_parser("render", help="render a grid to a PNG")
+    render.add_argument("source")
+    render.add_argument("target")
+    render.add_argument("--zoom", type=int, help="pixels per cell as a power of two (negative: zoomed out)")
+    render.add_argument("--region", nargs=4, type=int, metavar=("TOP", "LEFT", "BOTTOM", "RIGHT"),
+                        help="cells to render (default: the painted bounds)")
+    render.add_argument("--max-size", type=int, default=4096, help="largest image side when picking the zoom")
+    render.set_defaults(func=cmd_render)
+    
+    sim = commands.add_parser("sim", help="run cellular automaton generations")
+    sim.add_argument("source")
+    sim.add_argument("-o", "--output", help="where to write the result (default: overwrite the source)")
+    sim.add_argument("--steps", type=int, required=True)
+    sim.add_argument("--rule", default=LIFE)
+    sim.add_argument("--engine", choices=["chunks", "tiles", "hashlife"], default="chunks")
+    sim.add_argument("--workers", type=int, help="processes for the tiles engine (default: all cores)")
+    sim.set_defaults(func=cmd_sim)
+    
+    stats = commands.add_parser("stats", help="print cell counts, bounds and density")
+    stats.add_argument("sources", nargs="+")
+    stats.add_argument("--json", action="store_true", help="one JSON object per line")
+    stats.set_defaults(func=cmd_stats)
+    
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"grid2d: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,781 @@
+﻿import mmap
+import struct
+from array import array
+from collections import deque
+
+CHUNK_SHIFT = 6
+CHUNK_SIZE = 1 << CHUNK_SHIFT  # Chunks are CHUNK_SIZE x CHUNK_SIZE cells
+CHUNK_MASK = CHUNK_SIZE - 1
+_ONE = b"\x01"  # mmap.find needs bytes, not an int
+CHANGE_LOG_KEYS = 1 << 16  # Chunk changes kept for changed_since(); readers further behind resync from chunk_keys()
+
+class RegionOps:
+    """Batched region reads and writes shared by the grid stores
+    
+    A store provides chunk_keys(), chunks_in() and _chunk_buffer(key, create),
+    returning (buffer, offset) of a chunk's row-major cells or None, plus
+    _chunks_changed(keys) to recount and stamp the chunks after a batch.
+    
+    Every change is also appended to a bounded log of (generation, chunk keys),
+    so caches can ask for the chunks changed since they last looked without
+    scanning a stamp per chunk ever touched.
+    """
+    def _init_log(self):
+        self.log = deque()  # (generation, chunk keys changed at that generation), oldest first
+        self.log_keys = 0  # Keys held by the log
+        self.log_start = 0  # Every change after this generation is still in the log
+    
+    def _log(self, keys):
+        self.log.append((self.generation, tuple(keys)))
+        self.log_keys += len(keys)
+        while self.log_keys > CHANGE_LOG_KEYS and len(self.log) > 1:
+            generation, dropped = self.log.popleft()
+            self.log_keys -= len(dropped)
+            self.log_start = generation
+    
+    def changed_since(self, generation):
+        """Keys of the chunks changed (painted, loaded or emptied) after generation
+        
+        None if the log no longer reaches back that far; the caller then has to
+        rescan chunk_keys() instead.
+        """
+        if generation < self.log_start:
+            return None
+        keys = set()
+        for changed_generation, changed in reversed(self.log):
+            if changed_generation <= generation:
+                break
+            keys.update(changed)
+        return keys
+    
+
+    def bounds(self):
+        """(top, left, bottom, right) of the set cells, exclusive at bottom/right, or None if empty"""
+        top = left = bottom = right = None
+        for key in self.chunk_keys():
+            buf, base = self._chunk_buffer(key, create=False)
+            base_row, base_col = key[0] << CHUNK_SHIFT, key[1] << CHUNK_SHIFT
+            for local_row in range(CHUNK_SIZE):
+                offset = base + (local_row << CHUNK_SHIFT)
+                first = buf.find(_ONE, offset, offset + CHUNK_SIZE)
+                if first < 0:
+                    continue
+                last = buf.rfind(_ONE, offset, offset + CHUNK_SIZE)
+                row, first_col, end_col = base_row + local_row, base_col + first - offset, base_col + last - offset + 1
+                if top is None:
+                    top, left, bottom, right = row, first_col, row + 1, end_col
+                else:
+                    top, bottom = min(top, row), max(bottom, row + 1)
+                    left, right = min(left, first_col), max(right, end_col)
+        return None if top is None else (top, left, bottom, right)
+    
+    def read_region(self, top, left, bottom, right):
+        """Copy rows [top, bottom), cols [left, right) into a row-major bytearray"""
+        width = right - left
+        out = bytearray(width * max(bottom - top, 0))
+        for chunk_row, chunk_col, chunk in self.chunks_in(top, left, bottom, right):
+            base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+            col_start, col_end = max(left, base_col), min(right, base_col + CHUNK_SIZE)
+            for row in range(max(top, base_row), min(bottom, base_row + CHUNK_SIZE)):
+                src = ((row - base_row) << CHUNK_SHIFT) + col_start - base_col
+                dst = (row - top) * width + col_start - left
+                out[dst:dst + col_end - col_start] = chunk[src:src + col_end - col_start]
+        return out
+    
+    def write_region(self, top, left, bottom, right, data):
+        """Overwrite rows [top, bottom), cols [left, right) from a row-major buffer, as one batch"""
+        width = right - left
+        touched = set()
+        for chunk_row in range(top >> CHUNK_SHIFT, ((bottom - 1) >> CHUNK_SHIFT) + 1):
+            for chunk_col in range(left >> CHUNK_SHIFT, ((right - 1) >> CHUNK_SHIFT) + 1):
+                base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+                col_start, col_end = max(left, base_col), min(right, base_col + CHUNK_SIZE)
+                row_start, row_end = max(top, base_row), min(bottom, base_row + CHUNK_SIZE)
+                
+                # Skip allocating chunks that would stay empty
+                key = (chunk_row, chunk_col)
+                has_cells = any(
+                    data.find(1, (row - top) * width + col_start - left, (row - top) * width + col_end - left) >= 0
+                    for row in range(row_start, row_end))
+                target = self._chunk_buffer(key, create=has_cells)
+                if target is None:
+                    continue
+                buf, offset = target
+                for row in range(row_start, row_end):
+                    src = (row - top) * width + col_start - left
+                    dst = offset + ((row - base_row) << CHUNK_SHIFT) + col_start - base_col
+                    buf[dst:dst + col_end - col_start] = data[src:src + col_end - col_start]
+                touched.add(key)
+        self._chunks_changed(touched)
+    
+    def fill_spans(self, spans, value):
+        """Set every cell of each (row, col_start, col_end) span to value, as one batch"""
+        fill = bytes([1 if value else 0]) * CHUNK_SIZE
+        touched = set()
+        for row, col_start, col_end in spans:
+            chunk_row, local_row = row >> CHUNK_SHIFT, (row & CHUNK_MASK) << CHUNK_SHIFT
+            col = col_start
+            while col < col_end:
+                chunk_col = col >> CHUNK_SHIFT
+                end = min(col_end, (chunk_col + 1) << CHUNK_SHIFT)
+                target = self._chunk_buffer((chunk_row, chunk_col), create=bool(value))
+                if target is not None:
+                    buf, offset = target
+                    start = offset + local_row + (col & CHUNK_MASK)
+                    buf[start:start + end - col] = fill[:end - col]
+                    touched.add((chunk_row, chunk_col))
+                col = end
+        self._chunks_changed(touched)
+
+class ChunkedGrid(RegionOps):
+    """Unbounded binary cell grid stored as sparse fixed-size chunks
+    
+    Each chunk is a row-major bytearray of CHUNK_SIZE * CHUNK_SIZE cells (0 or 1),
+    allocated on the first write of a 1 and freed again when its last cell is
+    cleared, so memory follows the painted area rather than the canvas size.
+    Cells are addressed (row, col) like the old list-of-lists grid; any
+    integer, including negatives, is a valid coordinate.
+    """
+    def __init__(self):
+        self.chunks = {}  # (chunk_row, chunk_col) -> bytearray
+        self.counts = {}  # (chunk_row, chunk_col) -> number of set cells in the chunk
+        self.stamps = {}  # (chunk_row, chunk_col) -> generation of a non-empty chunk's last change
+        self.generation = 0  # Bumped on every change, so caches can tell stale chunks apart
+        self._init_log()
+    
+    def __len__(self):
+        """Number of set cells"""
+        return sum(self.counts.values())
+    
+    def get(self, row, col):
+        chunk = self.chunks.get((row >> CHUNK_SHIFT, col >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        return chunk[((row & CHUNK_MASK) << CHUNK_SHIFT) | (col & CHUNK_MASK)]
+    
+    def set(self, row, col, value):
+        key = (row >> CHUNK_SHIFT, col >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not value:
+                return  # Clearing an unallocated chunk is a no-op
+            chunk = self.chunks[key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+            self.counts[key] = 0
+        
+        index = ((row & CHUNK_MASK) << CHUNK_SHIFT) | (col & CHUNK_MASK)
+        value = 1 if value else 0
+        old = chunk[index]
+        if old == value:
+            return
+        chunk[index] = value
+        self.counts[key] += value - old
+        self.generation += 1
+        self._log((key,))
+        if self.counts[key]:
+            self.stamps[key] = self.generation
+        else:
+            del self.chunks[key]
+            del self.counts[key]
+            del self.stamps[key]
+    
+    def set_chunk(self, chunk_row, chunk_col, chunk):
+        """Install a whole row-major chunk of 0/1 bytes (e.g. from a file), replacing any existing one"""
+        key = (chunk_row, chunk_col)
+        count = chunk.count(1)
+        if not count and key not in self.chunks:
+            return
+        self.generation += 1
+        self._log((key,))
+        if count:
+            self.chunks[key] = chunk
+            self.counts[key] = count
+            self.stamps[key] = self.generation
+        else:
+            del self.chunks[key]
+            del self.counts[key]
+            self.stamps.pop(key, None)
+    
+    def chunk_keys(self):
+        """Keys of the chunks holding any set cell"""
+        return list(self.chunks)
+    
+    def get_chunk(self, chunk_row, chunk_col):
+        """Row-major cells of a chunk, or None if it is empty"""
+        return self.chunks.get((chunk_row, chunk_col))
+    
+    def _chunk_buffer(self, key, create):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not create:
+                return None
+            chunk = self.chunks[key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+            self.counts[key] = 0
+        return chunk, 0
+    
+    def _chunks_changed(self, keys):
+        if not keys:
+            return
+        self.generation += 1
+        self._log(keys)
+        for key in keys:
+            count = self.chunks[key].count(1)
+            if count:
+                self.counts[key] = count
+                self.stamps[key] = self.generation
+            else:
+                del self.chunks[key]
+                del self.counts[key]
+                self.stamps.pop(key, None)
+    
+    def clear(self):
+        if not self.chunks:
+            return
+        self.generation += 1
+        self._log(self.chunks)
+        self.chunks.clear()
+        self.counts.clear()
+        self.stamps.clear()
+    
+    def chunks_in(self, top, left, bottom, right):
+        """Yield (chunk_row, chunk_col, chunk) for allocated chunks overlapping rows [top, bottom), cols [left, right)"""
+        if bottom <= top or right <= left:
+            return
+        first_row, last_row = top >> CHUNK_SHIFT, (bottom - 1) >> CHUNK_SHIFT
+        first_col, last_col = left >> CHUNK_SHIFT, (right - 1) >> CHUNK_SHIFT
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > len(self.chunks):
+            # Viewport spans more chunk slots than exist: walk the allocated ones instead
+            for (chunk_row, chunk_col), chunk in self.chunks.items():
+                if first_row <= chunk_row <= last_row and first_col <= chunk_col <= last_col:
+                    yield chunk_row, chunk_col, chunk
+            return
+        for chunk_row in range(first_row, last_row + 1):
+            for chunk_col in range(first_col, last_col + 1):
+                chunk = self.chunks.get((chunk_row, chunk_col))
+                if chunk is not None:
+                    yield chunk_row, chunk_col, chunk
+    
+    def cells_in(self, top, left, bottom, right):
+        """Yield (row, col) of every set cell in rows [top, bottom), cols [left, right)"""
+        for chunk_row, chunk_col, chunk in self.chunks_in(top, left, bottom, right):
+            base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+            col_start = max(left - base_col, 0)
+            col_end = min(right - base_col, CHUNK_SIZE)
+            for local_row in range(max(top - base_row, 0), min(bottom - base_row, CHUNK_SIZE)):
+                offset = local_row << CHUNK_SHIFT
+                # bytearray.find scans in C, so empty stretches cost almost nothing
+                index = chunk.find(1, offset + col_start, offset + col_end)
+                while index >= 0:
+                    yield base_row + local_row, base_col + (index & CHUNK_MASK)
+                    index = chunk.find(1, index + 1, offset + col_end)
+    
+    def to_rows(self, top=0, left=0, bottom=None, right=None):
+        """Dense list-of-lists of the region starting at (top, left), extended to the painted bounds by default"""
+        bounds = self.bounds()
+        if bottom is None:
+            bottom = max(top, bounds[2]) if bounds else top
+        if right is None:
+            right = max(left, bounds[3]) if bounds else left
+        rows = [[0] * (right - left) for _ in range(bottom - top)]
+        for row, col in self.cells_in(top, left, bottom, right):
+            rows[row - top][col - left] = 1
+        return rows
+    
+    @classmethod
+    def from_rows(cls, rows, top=0, left=0):
+        """Grid from a dense list-of-lists (e.g. a legacy JSON save) placed at (top, left)"""
+        grid = cls()
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                if value:
+                    grid.set(top + i, left + j, 1)
+        return grid
+
+# Memory-mapped grid file (.g2m) layout (little endian):
+#   header: magic, version, chunk size, chunk rows, chunk cols
+#   population table: uint16 set-cell count per chunk, row-major
+#   then, from the next page boundary, one CHUNK_SIZE * CHUNK_SIZE byte tile per chunk, row-major
+# A 64x64 tile is exactly one 4 KiB page, so viewing or editing a region only
+# pages in the tiles under it, and the file is created sparse.
+MAP_MAGIC = b"G2DM"
+MAP_VERSION = 1
+_MAP_HEADER = struct.Struct("<4sHHII")
+_COUNT = struct.Struct("<H")
+_TILE = CHUNK_SIZE * CHUNK_SIZE
+
+class MappedGrid(RegionOps):
+    """Fixed-size binary cell grid backed by a memory-mapped file
+    
+    Same cell and chunk interface as ChunkedGrid, for documents too large to keep
+    in RAM: edits write straight through to the map and flush() makes them
+    durable. Only cells within rows * cols (rounded up to whole chunks) exist;
+    reads outside are 0 and writes outside are ignored.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'r+b')
+        try:
+            header = self.file.read(_MAP_HEADER.size)
+            if len(header) != _MAP_HEADER.size:
+                raise ValueError("Not a mapped Grid2D file")
+            magic, version, chunk_size, self.chunk_rows, self.chunk_cols = _MAP_HEADER.unpack(header)
+            if magic != MAP_MAGIC:
+                raise ValueError("Not a mapped Grid2D file")
+            if version > MAP_VERSION:
+                raise ValueError(f"Unsupported mapped Grid2D file version: {version}")
+            if chunk_size != CHUNK_SIZE:
+                raise ValueError(f"Unsupported Grid2D chunk size: {chunk_size}")
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        except Exception:
+            self.file.close()
+            raise
+        self.rows, self.cols = self.chunk_rows << CHUNK_SHIFT, self.chunk_cols << CHUNK_SHIFT
+        self.tiles_offset = self._tiles_offset(self.chunk_rows, self.chunk_cols)
+        if len(self.map) < self.tiles_offset + self.chunk_rows * self.chunk_cols * _TILE:
+            self.close()
+            raise ValueError("Corrupt mapped Grid2D file: truncated")
+        self.stamps = {}  # (chunk_row, chunk_col) -> generation of the chunk's last change this session
+        self.generation = 0
+        self._init_log()
+    
+    @staticmethod
+    def _tiles_offset(chunk_rows, chunk_cols):
+        table_end = _MAP_HEADER.size + _COUNT.size * chunk_rows * chunk_cols
+        return -(-table_end // mmap.PAGESIZE) * mmap.PAGESIZE
+    
+    @classmethod
+    def create(cls, path, rows, cols):
+        """Create an empty mapped grid of at least rows x cols cells; no tile storage is allocated up front"""
+        chunk_rows, chunk_cols = -(-rows // CHUNK_SIZE), -(-cols // CHUNK_SIZE)
+        with open(path, 'wb') as f:
+            f.write(_MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, CHUNK_SIZE, chunk_rows, chunk_cols))
+            f.truncate(cls._tiles_offset(chunk_rows, chunk_cols) + chunk_rows * chunk_cols * _TILE)
+        return cls(path)
+    
+    def __len__(self):
+        """Number of set cells (reads only the population table)"""
+        count = self.chunk_rows * self.chunk_cols
+        return sum(struct.unpack_from(f"<{count}H", self.map, _MAP_HEADER.size))
+    
+    def _count_offset(self, chunk_row, chunk_col):
+        return _MAP_HEADER.size + _COUNT.size * (chunk_row * self.chunk_cols + chunk_col)
+    
+    def _tile_offset(self, chunk_row, chunk_col):
+        return self.tiles_offset + _TILE * (chunk_row * self.chunk_cols + chunk_col)
+    
+    def _cell_offset(self, row, col):
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        tile = self._tile_offset(row >> CHUNK_SHIFT, col >> CHUNK_SHIFT)
+        return tile + (((row & CHUNK_MASK) << CHUNK_SHIFT) | (col & CHUNK_MASK))
+    
+    def get(self, row, col):
+        offset = self._cell_offset(row, col)
+        return 0 if offset is None else self.map[offset]
+    
+    def set(self, row, col, value):
+        offset = self._cell_offset(row, col)
+        if offset is None:
+            return
+        value = 1 if value else 0
+        old = self.map[offset]
+        if old == value:
+            return
+        self.map[offset] = value
+        key = (row >> CHUNK_SHIFT, col >> CHUNK_SHIFT)
+        count_offset = self._count_offset(*key)
+        (count,) = _COUNT.unpack_from(self.map, count_offset)
+        _COUNT.pack_into(self.map, count_offset, count + value - old)
+        self.generation += 1
+        self.stamps[key] = self.generation
+        self._log((key,))
+    
+    def set_chunk(self, chunk_row, chunk_col, chunk):
+        if not (0 <= chunk_row < self.chunk_rows and 0 <= chunk_col < self.chunk_cols):
+            return
+        offset = self._tile_offset(chunk_row, chunk_col)
+        self.map[offset:offset + _TILE] = bytes(chunk)
+        _COUNT.pack_into(self.map, self._count_offset(chunk_row, chunk_col), chunk.count(1))
+        self.generation += 1
+        self.stamps[(chunk_row, chunk_col)] = self.generation
+        self._log(((chunk_row, chunk_col),))
+    
+    def chunk_keys(self):
+        """Keys of the chunks holding any set cell (reads only the population table)"""
+        count = self.chunk_rows * self.chunk_cols
+        counts = struct.unpack_from(f"<{count}H", self.map, _MAP_HEADER.size)
+        return [divmod(index, self.chunk_cols) for index, n in enumerate(counts) if n]
+    
+    def get_chunk(self, chunk_row, chunk_col):
+        """Cells of a chunk as a memoryview into the map, or None if it is empty or outside the grid"""
+        if not (0 <= chunk_row < self.chunk_rows and 0 <= chunk_col < self.chunk_cols):
+            return None
+        (count,) = _COUNT.unpack_from(self.map, self._count_offset(chunk_row, chunk_col))
+        if not count:
+            return None
+        offset = self._tile_offset(chunk_row, chunk_col)
+        return memoryview(self.map)[offset:offset + _TILE]
+    
+    def _chunk_buffer(self, key, create):
+        chunk_row, chunk_col = key
+        if not (0 <= chunk_row < self.chunk_rows and 0 <= chunk_col < self.chunk_cols):
+            return None
+        return self.map, self._tile_offset(chunk_row, chunk_col)
+    
+    def _chunks_changed(self, keys):
+        if not keys:
+            return
+        self.generation += 1
+        for key in keys:
+            offset = self._tile_offset(*key)
+            _COUNT.pack_into(self.map, self._count_offset(*key), self.map[offset:offset + _TILE].count(1))
+            self.stamps[key] = self.generation
+        self._log(keys)
+    
+    def clear(self):
+        """Zero every non-empty tile (found from the population table) and its count"""
+        keys = self.chunk_keys()
+        if not keys:
+            return
+        self.generation += 1
+        for key in keys:
+            offset = self._tile_offset(*key)
+            self.map[offset:offset + _TILE] = bytes(_TILE)
+            _COUNT.pack_into(self.map, self._count_offset(*key), 0)
+            self.stamps[key] = self.generation
+        self._log(keys)
+    
+    def chunks_in(self, top, left, bottom, right):
+        """Yield (chunk_row, chunk_col, tile) for non-empty chunks overlapping the region
+        
+        Tiles are memoryviews into the map, valid until close(); only the
+        population table is read for empty chunks.
+        """
+        first_row, last_row = max(top >> CHUNK_SHIFT, 0), min((bottom - 1) >> CHUNK_SHIFT, self.chunk_rows - 1)
+        first_col, last_col = max(left >> CHUNK_SHIFT, 0), min((right - 1) >> CHUNK_SHIFT, self.chunk_cols - 1)
+        view = memoryview(self.map)
+        for chunk_row in range(first_row, last_row + 1):
+            for chunk_col in range(first_col, last_col + 1):
+                (count,) = _COUNT.unpack_from(self.map, self._count_offset(chunk_row, chunk_col))
+                if count:
+                    offset = self._tile_offset(chunk_row, chunk_col)
+                    yield chunk_row, chunk_col, view[offset:offset + _TILE]
+    
+    def cells_in(self, top, left, bottom, right):
+        """Yield (row, col) of every set cell in rows [top, bottom), cols [left, right)"""
+        for chunk_row, chunk_col, tile in self.chunks_in(top, left, bottom, right):
+            tile.release()
+            base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+            tile_offset = self._tile_offset(chunk_row, chunk_col)
+            col_start = max(left - base_col, 0)
+            col_end = min(right - base_col, CHUNK_SIZE)
+            for local_row in range(max(top - base_row, 0), min(bottom - base_row, CHUNK_SIZE)):
+                offset = tile_offset + (local_row << CHUNK_SHIFT)
+                index = self.map.find(_ONE, offset + col_start, offset + col_end)
+                while index >= 0:
+                    yield base_row + local_row, base_col + (index - offset)
+                    index = self.map.find(_ONE, index + 1, offset + col_end)
+    
+    def flush(self):
+        self.map.flush()
+    
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+# Painting
+
+BRUSH_SQUARE = "square"
+BRUSH_CIRCLE = "circle"
+
+def line_cells(row0, col0, row1, col1):
+    """Cells on the segment between two cells (Bresenham), both ends included"""
+    d_row, d_col = abs(row1 - row0), -abs(col1 - col0)
+    step_row, step_col = (1 if row1 > row0 else -1), (1 if col1 > col0 else -1)
+    error = d_row + d_col
+    row, col = row0, col0
+    while True:
+        yield row, col
+        if row == row1 and col == col1:
+            return
+        doubled = 2 * error
+        if doubled >= d_col:
+            error += d_col
+            row += step_row
+        if doubled <= d_row:
+            error += d_row
+            col += step_col
+
+def brush_spans(size, shape=BRUSH_SQUARE):
+    """Brush footprint as (row offset, col start offset, col end offset) spans, centered on the cell"""
+    if size <= 1:
+        return [(0, 0, 1)]
+    low = -(size // 2)
+    spans = []
+    for d_row in range(low, low + size):
+        if shape == BRUSH_CIRCLE:
+            # Half-width of the disc at this row, measured from cell centers
+            y = d_row - low + 0.5 - size / 2
+            half = (max(size * size / 4 - y * y, 0)) ** 0.5
+            start, end = round(size / 2 - half), round(size / 2 + half)
+            if end > start:
+                spans.append((d_row, low + start, low + end))
+        else:
+            spans.append((d_row, low, low + size))
+    return spans
+
+def stroke_spans(points, size=1, shape=BRUSH_SQUARE):
+    """Merged row spans covered by dragging the brush through points (cell positions) in order"""
+    brush = brush_spans(size, shape)
+    by_row = {}
+    previous = None
+    for point in points:
+        cells = [point] if previous is None else line_cells(*previous, *point)
+        for row, col in cells:
+            for d_row, start, end in brush:
+                by_row.setdefault(row + d_row, []).append((col + start, col + end))
+        previous = point
+    
+    spans = []
+    for row, intervals in by_row.items():
+        intervals.sort()
+        start, end = intervals[0]
+        for next_start, next_end in intervals[1:]:
+            if next_start > end:
+                spans.append((row, start, end))
+                start = next_start
+            end = max(end, next_end)
+        spans.append((row, start, end))
+    return spans
+
+def flood_fill(grid, row, col, value, top, left, bottom, right, spans=None):
+    """Fill the 4-connected area of equal cells around (row, col) with value, within the bounds
+    
+    An unbounded canvas has no natural edge for filling empty space, so the
+    caller passes the region (typically the viewport). The region is copied out
+    once, filled with a span-based scanline fill whose span searches run as
+    bytearray.find/rfind in C, and written back as a single batch.
+    Returns the number of cells changed; if a spans list is given, the filled
+    (row, col_start, col_end) spans are appended to it.
+    """
+    if not (top <= row < bottom and left <= col < right):
+        return 0
+    value = 1 if value else 0
+    width = right - left
+    data = grid.read_region(top, left, bottom, right)
+    target = data[(row - top) * width + col - left]
+    if target == value:
+        return 0
+    other = bytes([1 - target])  # Binary cells: whatever is not the target stops the fill
+    target_byte = bytes([target])
+    
+    filled = 0
+    stack = [(row - top, col - left)]
+    while stack:
+        y, x = stack.pop()
+        line = y * width
+        if data[line + x] != target:
+            continue
+        found = data.rfind(other, line, line + x)
+        start = found + 1 if found >= 0 else line
+        end = data.find(other, line + x, line + width)
+        if end < 0:
+            end = line + width
+        data[start:end] = bytes([value]) * (end - start)
+        filled += end - start
+        if spans is not None:
+            spans.append((top + y, left + start - line, left + end - line))
+        
+        # Seed one point per run of target cells in the rows above and below
+        for y2 in (y - 1, y + 1):
+            if not 0 <= y2 < bottom - top:
+                continue
+            offset = y2 * width - line
+            seed = data.find(target_byte, start + offset, end + offset)
+            while seed >= 0:
+                stack.append((y2, seed - y2 * width))
+                run_end = data.find(other, seed, end + offset)
+                if run_end < 0:
+                    break
+                seed = data.find(target_byte, run_end, end + offset)
+    
+    grid.write_region(top, left, bottom, right, data)
+    return filled
+
+
+# Undo history
+
+_DENSE_FLIPS = CHUNK_SIZE * CHUNK_SIZE // 16  # Above this many flips a chunk's diff is kept as a bit mask
+_TO_BITS = bytes.maketrans(b"\x00\x01", b"01")
+_FROM_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+class EditHistory:
+    """Undo/redo of grid edits as per-chunk sets of flipped cells
+    
+    Cells are binary, so an edit is fully described by which cells it flipped,
+    and undoing and redoing are the same operation. Each step keeps, per chunk
+    it touched, the flipped cell indices as an array of uint16, or a packed
+    4096-bit mask once more than 1/16 of the chunk flipped; both undo and redo
+    cost O(changed cells) whatever the canvas size. Steps are dropped oldest
+    first once the history exceeds `budget` bytes. Edits made around the history
+    (simulation steps, loading) to a chunk it holds diffs for leave those diffs
+    meaningless, so they clear it; edits to other chunks, such as streaming in the
+    rest of a file, are found through grid.changed_since() and leave it alone.
+    """
+    def __init__(self, grid, budget=64 << 20):
+        self.grid = grid
+        self.budget = budget
+        self.undo_steps = deque()  # Oldest first; each a list of (chunk key, flips)
+        self.redo_steps = []
+        self.size = 0  # Approximate bytes held by both stacks
+        self.pending = {}  # Chunk key -> set of flipped indices, for the step being recorded
+        self.touched = {}  # Chunk key -> number of undo/redo steps with a diff for it
+        self.generation = grid.generation  # grid.generation after our last change or check
+    
+    def _check_outside_edits(self):
+        if self.grid.generation == self.generation:
+            return
+        changed = self.grid.changed_since(self.generation)
+        if changed is None or any(key in self.touched or key in self.pending for key in changed):
+            self.clear()
+        self.generation = self.grid.generation
+    
+    def _count_step(self, step, delta):
+        for key, _ in step:
+            refs = self.touched.get(key, 0) + delta
+            if refs:
+                self.touched[key] = refs
+            else:
+                del self.touched[key]
+    
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.pending.clear()
+        self.touched.clear()
+        self.size = 0
+        self.generation = self.grid.generation
+    
+    def _flip(self, key, indices):
+        self.pending.setdefault(key, set()).symmetric_difference_update(indices)
+    
+    def fill_spans(self, spans, value):
+        """grid.fill_spans(), recording the cells that actually change into the current step"""
+        self._check_outside_edits()
+        value = 1 if value else 0
+        other = bytes([1 - value])
+        for row, col_start, col_end in spans:
+            chunk_row, local_row = row >> CHUNK_SHIFT, (row & CHUNK_MASK) << CHUNK_SHIFT
+            col = col_start
+            while col < col_end:
+                chunk_col = col >> CHUNK_SHIFT
+                end = min(col_end, (chunk_col + 1) << CHUNK_SHIFT)
+                start, stop = local_row + (col & CHUNK_MASK), local_row + (col & CHUNK_MASK) + end - col
+                target = self.grid._chunk_buffer((chunk_row, chunk_col), create=False)
+                if target is None:
+                    if value:  # Nothing allocated yet: every cell goes 0 -> 1
+                        self._flip((chunk_row, chunk_col), range(start, stop))
+                else:
+                    buf, offset = target
+                    changed = []
+                    index = buf.find(other, offset + start, offset + stop)
+                    while index >= 0:
+                        changed.append(index - offset)
+                        index = buf.find(other, index + 1, offset + stop)
+                    self._flip((chunk_row, chunk_col), changed)
+                col = end
+        self.grid.fill_spans(spans, value)
+        self.generation = self.grid.generation
+    
+    def flood_fill(self, row, col, value, top, left, bottom, right):
+        """flood_fill() on the grid, recording the filled cells into the current step"""
+        self._check_outside_edits()
+        spans = []
+        filled = flood_fill(self.grid, row, col, value, top, left, bottom, right, spans)
+        for span_row, col_start, col_end in spans:
+            chunk_row, local_row = span_row >> CHUNK_SHIFT, (span_row & CHUNK_MASK) << CHUNK_SHIFT
+            col = col_start
+            while col < col_end:
+                chunk_col = col >> CHUNK_SHIFT
+                end = min(col_end, (chunk_col + 1) << CHUNK_SHIFT)
+                start = local_row + (col & CHUNK_MASK)
+                self._flip((chunk_row, chunk_col), range(start, start + end - col))
+                col = end
+        self.generation = self.grid.generation
+        return filled
+    
+    def commit(self):
+        """Close the current step (e.g. at the end of a stroke); return True if it changed anything"""
+        step = []
+        for key, indices in self.pending.items():
+            if not indices:
+                continue
+            if len(indices) > _DENSE_FLIPS:
+                mask = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+                for index in indices:
+                    mask[index] = 1
+                step.append((key, int(mask.translate(_TO_BITS), 2)))
+            else:
+                step.append((key, array("H", sorted(indices))))
+        self.pending.clear()
+        if not step:
+            return False
+        for redo in self.redo_steps:
+            self.size -= self._step_size(redo)
+            self._count_step(redo, -1)
+        self.redo_steps.clear()
+        self.undo_steps.append(step)
+        self.size += self._step_size(step)
+        self._count_step(step, 1)
+        while self.size > self.budget and self.undo_steps:
+            dropped = self.undo_steps.popleft()
+            self.size -= self._step_size(dropped)
+            self._count_step(dropped, -1)
+        return True
+    
+    @staticmethod
+    def _step_size(step):
+        """Rough bytes held by a step: the diffs plus per-chunk bookkeeping"""
+        return sum(64 + (len(flips) * 2 if isinstance(flips, array) else CHUNK_SIZE * CHUNK_SIZE // 8)
+                   for _, flips in step)
+    
+    def _apply(self, step):
+        touched = set()
+        for key, flips in step:
+            target = self.grid._chunk_buffer(key, create=True)
+            if target is None:
+                continue  # Outside a fixed-size grid
+            buf, offset = target
+            if isinstance(flips, array):
+                for index in flips:
+                    buf[offset + index] ^= 1
+            else:
+                mask = format(flips, f"0{CHUNK_SIZE * CHUNK_SIZE}b").encode("ascii").translate(_FROM_BITS)
+                cells = int.from_bytes(buf[offset:offset + CHUNK_SIZE * CHUNK_SIZE], "big")
+                cells ^= int.from_bytes(mask, "big")
+                buf[offset:offset + CHUNK_SIZE * CHUNK_SIZE] = cells.to_bytes(CHUNK_SIZE * CHUNK_SIZE, "big")
+            touched.add(key)
+        self.grid._chunks_changed(touched)
+        self.generation = self.grid.generation
+    
+    def undo(self):
+        """Revert the latest step; return False if there is none"""
+        self._check_outside_edits()
+        self.commit()
+        if not self.undo_steps:
+            return False
+        step = self.undo_steps.pop()
+        self._apply(step)
+        self.redo_steps.append(step)
+        return True
+    
+    def redo(self):
+        """Reapply the latest undone step; return False if there is none"""
+        self._check_outside_edits()
+        self.commit()  # A new edit in progress ends the redo chain
+        if not self.redo_steps:
+            return False
+        step = self.redo_steps.pop()
+        self._apply(step)
+        self.undo_steps.append(step)
+        return True
@@ -0,0 +1,185 @@
+﻿import json
+import struct
+import time
+import zlib
+
+from grid2d_core import CHUNK_SHIFT, CHUNK_SIZE, ChunkedGrid
+
+# Binary .g2d layout (little endian):
+#   header: magic, version, chunk size, chunk count
+#   index: per chunk chunk_row, chunk_col (int32), offset from file start (uint64), byte length (uint32)
+#   then each chunk's cells, one bit per cell row-major (MSB first), zlib-compressed
+# The index lets a reader fetch just the chunks around the camera.
+FILE_MAGIC = b"G2DB"
+FILE_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_INDEX_ENTRY = struct.Struct("<iiQI")
+
+LOAD_BUDGET = 0.004  # Seconds per load_some() call, e.g. per frame while a file streams in
+_BLOCK_SHIFT = 4  # Pending chunks are grouped in 16x16-chunk blocks to find the nearest without sorting them all
+
+_CELLS = CHUNK_SIZE * CHUNK_SIZE
+_TO_BITS = bytes.maketrans(b"\x00\x01", b"01")
+_FROM_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+def pack_chunk(chunk):
+    """Bit-pack a chunk of 0/1 bytes and compress it"""
+    bits = int(bytes(chunk).translate(_TO_BITS), 2)
+    return zlib.compress(bits.to_bytes(_CELLS // 8, "big"))
+
+def unpack_chunk(data):
+    bits = int.from_bytes(zlib.decompress(data), "big")
+    return bytearray(format(bits, f"0{_CELLS}b").encode("ascii").translate(_FROM_BITS))
+
+def save_g2d(grid, path, executor=None):
+    """Write a grid as a binary .g2d file, compressing on a TiledExecutor's pool if given"""
+    if executor is not None:
+        blobs = executor.pack_chunks(grid)
+    else:
+        blobs = [(key, pack_chunk(grid.get_chunk(*key))) for key in sorted(grid.chunk_keys())]
+    offset = _HEADER.size + _INDEX_ENTRY.size * len(blobs)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, CHUNK_SIZE, len(blobs)))
+        for (chunk_row, chunk_col), blob in blobs:
+            f.write(_INDEX_ENTRY.pack(chunk_row, chunk_col, offset, len(blob)))
+            offset += len(blob)
+        for _, blob in blobs:
+            f.write(blob)
+
+class G2DReader:
+    """Random-access reader for a binary .g2d file
+    
+    Only the header and chunk index are read up front. Chunks are then loaded on
+    demand into a grid: a region (e.g. the viewport) at once, or the rest within a
+    time budget per call, nearest block first, so a large file is usable before it
+    has fully loaded. The pending chunks are grouped in blocks so neither kind of
+    call has to scan or sort every pending chunk.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            magic, version, chunk_size, count = _HEADER.unpack(self.file.read(_HEADER.size))
+            if magic != FILE_MAGIC:
+                raise ValueError("Not a binary Grid2D file")
+            if version > FILE_VERSION:
+                raise ValueError(f"Unsupported Grid2D file version: {version}")
+            if chunk_size != CHUNK_SIZE:
+                raise ValueError(f"Unsupported Grid2D chunk size: {chunk_size}")
+            index = self.file.read(_INDEX_ENTRY.size * count)
+            if len(index) != _INDEX_ENTRY.size * count:
+                raise ValueError("Corrupt Grid2D file: truncated chunk index")
+        except Exception:
+            self.file.close()
+            raise
+        self.pending = {}  # (chunk_row, chunk_col) -> (offset, length) of chunks not loaded yet
+        self.blocks = {}  # (chunk_row >> _BLOCK_SHIFT, chunk_col >> _BLOCK_SHIFT) -> pending keys in that block
+        for chunk_row, chunk_col, offset, length in _INDEX_ENTRY.iter_unpack(index):
+            self.pending[(chunk_row, chunk_col)] = (offset, length)
+            self.blocks.setdefault((chunk_row >> _BLOCK_SHIFT, chunk_col >> _BLOCK_SHIFT), set()).add((chunk_row, chunk_col))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def close(self):
+        self.file.close()
+    
+    @property
+    def done(self):
+        return not self.pending
+    
+    def _load(self, grid, key):
+        offset, length = self.pending.pop(key)
+        block_key = (key[0] >> _BLOCK_SHIFT, key[1] >> _BLOCK_SHIFT)
+        block = self.blocks[block_key]
+        block.discard(key)
+        if not block:
+            del self.blocks[block_key]
+        self.file.seek(offset)
+        data = self.file.read(length)
+        if len(data) != length:
+            raise ValueError("Corrupt Grid2D file: truncated chunk data")
+        grid.set_chunk(key[0], key[1], unpack_chunk(data))
+    
+    def load_region(self, grid, top, left, bottom, right):
+        """Load the pending chunks overlapping rows [top, bottom), cols [left, right)"""
+        first_row, last_row = top >> CHUNK_SHIFT, (bottom - 1) >> CHUNK_SHIFT
+        first_col, last_col = left >> CHUNK_SHIFT, (right - 1) >> CHUNK_SHIFT
+        # Look up the pending blocks the region overlaps (or scan the blocks, if there are fewer), then the keys inside
+        block_rows = range(first_row >> _BLOCK_SHIFT, (last_row >> _BLOCK_SHIFT) + 1)
+        block_cols = range(first_col >> _BLOCK_SHIFT, (last_col >> _BLOCK_SHIFT) + 1)
+        if len(block_rows) * len(block_cols) <= len(self.blocks):
+            block_keys = [(block_row, block_col) for block_row in block_rows for block_col in block_cols]
+        else:
+            block_keys = [key for key in self.blocks if key[0] in block_rows and key[1] in block_cols]
+        for block_key in block_keys:
+            block = self.blocks.get(block_key)
+            if block is None:
+                continue
+            for key in [key for key in block if first_row <= key[0] <= last_row and first_col <= key[1] <= last_col]:
+                self._load(grid, key)
+    
+    def load_some(self, grid, near=(0, 0), budget=LOAD_BUDGET):
+        """Load pending chunks nearest the cell near for about budget seconds; return True while some remain
+        
+        Blocks are taken nearest first and chunks nearest first within each;
+        at least one chunk is loaded per call so the stream always finishes.
+        """
+        deadline = time.perf_counter() + budget
+        near_row, near_col = near[0] >> CHUNK_SHIFT, near[1] >> CHUNK_SHIFT
+        half = (1 << _BLOCK_SHIFT) // 2
+        for block_row, block_col in sorted(self.blocks, key=lambda b: ((b[0] << _BLOCK_SHIFT) + half - near_row)**2
+                                                                  + ((b[1] << _BLOCK_SHIFT) + half - near_col)**2):
+            for key in sorted(self.blocks[(block_row, block_col)],
+                              key=lambda k: (k[0] - near_row)**2 + (k[1] - near_col)**2):
+                self._load(grid, key)
+                if time.perf_counter() > deadline:
+                    return not self.done
+        return not self.done
+    
+    def load_all(self, grid):
+        for key in list(self.pending):
+            self._load(grid, key)
+
+def read_json_grid(data):
+    """Grid from the legacy JSON save: dense rows, or {"origin": [row, col], "rows": ...}"""
+    if isinstance(data, dict):
+        return ChunkedGrid.from_rows(data["rows"], *data["origin"])
+    return ChunkedGrid.from_rows(data)
+
+def json_grid_data(grid):
+    """The legacy JSON form of a ChunkedGrid, as read_json_grid() reads it back
+    
+    Plain dense rows from (0, 0), as older versions wrote them, unless a cell
+    lies at a negative row or column; only then {"origin": [row, col], "rows": ...}.
+    """
+    bounds = grid.bounds()
+    if bounds is None:
+        return []
+    top, left, bottom, right = bounds
+    if top >= 0 and left >= 0:
+        return grid.to_rows(0, 0, bottom, right)
+    return {"origin": [top, left], "rows": grid.to_rows(top, left, bottom, right)}
+
+def open_grid(path):
+    """Open a .g2d file of either format; return (grid, reader)
+    
+    Binary files come back as an empty grid plus a G2DReader to stream chunks
+    into it; legacy JSON files are read completely and reader is None.
+    """
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    if is_binary:
+        return ChunkedGrid(), G2DReader(path)
+    with open(path, 'r') as f:
+        return read_json_grid(json.load(f)), None
+
+def load_grid_file(path):
+    """Read a whole .g2d file of either format into a ChunkedGrid"""
+    grid, reader = open_grid(path)
+    if reader is not None:
+        with reader:
+            reader.load_all(grid)
+    return grid
@@ -0,0 +1,183 @@
+﻿import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from grid2d_core import CHUNK_SIZE, MappedGrid
+from grid2d_file import pack_chunk
+from grid2d_sim import LIFE, ChunkStepper, parse_rule, np
+
+_CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+# Worker functions: module level so spawned processes can import them. Each attaches
+# to the parent's shared blocks by name and writes only its own slice of the output.
+def _step_tiles(in_name, out_name, count, halo, start, end, lut, row_mask=None, col_mask=None):
+    size = CHUNK_SIZE + 2 * halo
+    source = shared_memory.SharedMemory(name=in_name)
+    target = shared_memory.SharedMemory(name=out_name)
+    try:
+        tiles = np.ndarray((count, size, size), dtype=np.uint8, buffer=source.buf)
+        out = np.ndarray((count, CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8, buffer=target.buf)
+        lut = np.frombuffer(lut, dtype=np.uint8)
+        cells = tiles[start:end]
+        if row_mask is not None:
+            # 1 for the tile rows/cols inside a bounded grid; cells outside are dead every generation
+            row_mask = np.frombuffer(row_mask, dtype=np.uint8).reshape(end - start, size)
+            col_mask = np.frombuffer(col_mask, dtype=np.uint8).reshape(end - start, size)
+        # Each generation leaves the tile one cell smaller on every side (the edge cells
+        # lack neighbours), so after `halo` generations exactly the central chunk is left
+        for g in range(1, halo + 1):
+            counts = (cells[:, :-2, :-2] + cells[:, :-2, 1:-1] + cells[:, :-2, 2:]
+                      + cells[:, 1:-1, :-2] + cells[:, 1:-1, 2:]
+                      + cells[:, 2:, :-2] + cells[:, 2:, 1:-1] + cells[:, 2:, 2:])
+            cells = lut[cells[:, 1:-1, 1:-1] * 9 + counts]
+            if row_mask is not None:
+                cells &= row_mask[:, g:size - g, None] & col_mask[:, None, g:size - g]
+        out[start:end] = cells
+        del tiles, out, cells
+    finally:
+        source.close()
+        target.close()
+
+def _pack_chunks(name, count, start, end):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return [pack_chunk(block.buf[i * _CELLS:(i + 1) * _CELLS]) for i in range(start, end)]
+    finally:
+        block.close()
+
+class TiledExecutor:
+    """Runs bulk grid2d work on a process pool, sharing cells through shared memory
+    
+    The non-empty chunks (plus a ring of neighbours for stepping) are copied once
+    into a shared block as halo-padded tiles and split into contiguous batches, one
+    task each. Workers map the block without copying, write disjoint slices of a
+    shared output block, and the parent stitches the results back into the grid after
+    every batch has finished, so the grid is only ever written by one process.
+    Without NumPy stepping falls back to the single-process ChunkStepper.
+    """
+    def __init__(self, workers=None, batches_per_worker=4):
+        self.workers = workers or os.cpu_count() or 1
+        self.batches_per_worker = batches_per_worker
+        self.pool = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
+    def _pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        return self.pool
+    
+    def _batches(self, count):
+        """Contiguous (start, end) ranges; a few per worker to even out uneven tiles"""
+        n = max(1, min(count, self.workers * self.batches_per_worker))
+        return [(count * i // n, count * (i + 1) // n) for i in range(n)]
+    
+    def step(self, grid, rule=LIFE, generations=1):
+        """Advance a grid in place by a number of generations; return the chunks computed
+        
+        Up to CHUNK_SIZE generations run per dispatch: the tiles carry that many halo
+        rows and columns from the neighbouring chunks, so workers need no exchange
+        in between.
+        """
+        if np is None:
+            stepper = ChunkStepper(grid, rule)
+            for _ in range(generations):
+                stepper.step()
+            return stepper.last_active
+        birth, survive = parse_rule(rule)
+        lut = bytes([n in birth for n in range(9)] + [n in survive for n in range(9)])
+        computed = 0
+        while generations > 0:
+            halo = min(generations, CHUNK_SIZE)
+            computed += self._step_tiles(grid, lut, halo)
+            generations -= halo
+        return computed
+    
+    def _step_tiles(self, grid, lut, halo):
+        keys = set()
+        for chunk_row, chunk_col in grid.chunk_keys():
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    keys.add((chunk_row + d_row, chunk_col + d_col))
+        keys = sorted(keys)
+        if not keys:
+            return 0
+        count, size = len(keys), CHUNK_SIZE + 2 * halo
+        source = shared_memory.SharedMemory(create=True, size=count * size * size)
+        target = shared_memory.SharedMemory(create=True, size=count * _CELLS)
+        try:
+            tiles = np.ndarray((count, size, size), dtype=np.uint8, buffer=source.buf)
+            tiles[:] = 0
+            self._fill_tiles(grid, keys, tiles, halo)
+            row_mask = col_mask = None
+            if isinstance(grid, MappedGrid):
+                # Cell row/col of every tile row/col, to keep the grid's outside dead between generations
+                offsets = np.arange(size) - halo
+                rows = np.array([key[0] for key in keys])[:, None] * CHUNK_SIZE + offsets
+                cols = np.array([key[1] for key in keys])[:, None] * CHUNK_SIZE + offsets
+                row_mask = ((rows >= 0) & (rows < grid.rows)).astype(np.uint8)
+                col_mask = ((cols >= 0) & (cols < grid.cols)).astype(np.uint8)
+            futures = [self._pool().submit(_step_tiles, source.name, target.name, count, halo, start, end, lut,
+                                           None if row_mask is None else row_mask[start:end].tobytes(),
+                                           None if col_mask is None else col_mask[start:end].tobytes())
+                       for start, end in self._batches(count)]
+            for future in futures:
+                future.result()
+            
+            # Stitch: only chunks whose cells changed are written back
+            out = np.ndarray((count, CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8, buffer=target.buf)
+            for i, key in enumerate(keys):
+                new = bytearray(out[i].tobytes())
+                old = grid.get_chunk(*key)
+                if (new != old) if old is not None else new.count(1):
+                    grid.set_chunk(key[0], key[1], new)
+            del tiles, out
+        finally:
+            source.close()
+            source.unlink()
+            target.close()
+            target.unlink()
+        return count
+    
+    @staticmethod
+    def _fill_tiles(grid, keys, tiles, halo):
+        """Copy each chunk and the nearest `halo` cells of its eight neighbours into its tile"""
+        size = CHUNK_SIZE + 2 * halo
+        for i, (chunk_row, chunk_col) in enumerate(keys):
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    chunk = grid.get_chunk(chunk_row + d_row, chunk_col + d_col)
+                    if chunk is None:
+                        continue
+                    cells = np.frombuffer(chunk, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+                    # Neighbour's cell (0, 0) in tile coordinates, then clip to the tile
+                    row, col = halo + d_row * CHUNK_SIZE, halo + d_col * CHUNK_SIZE
+                    top, left = max(row, 0), max(col, 0)
+                    bottom, right = min(row + CHUNK_SIZE, size), min(col + CHUNK_SIZE, size)
+                    tiles[i, top:bottom, left:right] = cells[top - row:bottom - row, left - col:right - col]
+    
+    def pack_chunks(self, grid):
+        """pack_chunk() of every non-empty chunk, in parallel; return [(key, blob)] sorted by key"""
+        keys = sorted(grid.chunk_keys())
+        if not keys:
+            return []
+        block = shared_memory.SharedMemory(create=True, size=len(keys) * _CELLS)
+        try:
+            for i, key in enumerate(keys):
+                block.buf[i * _CELLS:(i + 1) * _CELLS] = bytes(grid.get_chunk(*key))
+            futures = [self._pool().submit(_pack_chunks, block.name, len(keys), start, end)
+                       for start, end in self._batches(len(keys))]
+            blobs = [blob for future in futures for blob in future.result()]
+        finally:
+            block.close()
+            block.unlink()
+        return list(zip(keys, blobs))
@@ -0,0 +1,261 @@
+﻿import math
+import time
+
+import pygame
+
+from grid2d_core import CHUNK_SHIFT, CHUNK_SIZE
+
+MIN_ZOOM, MAX_ZOOM = -12, 5  # Zoom z draws each cell 2**z pixels wide
+GRID_LINE_ZOOM = 2  # Grid lines from 4 px cells up; below that they would cover the cells
+
+TILE_BUILD_BUDGET = 0.008  # Seconds per frame spent building overview tiles; the rest follow on later frames
+
+_HALF = CHUNK_SIZE // 2
+_EMPTY_QUARTER = [bytes(_HALF)] * _HALF
+
+def _halve(tile):
+    """Rows (32 of 32 bytes) of a 64x64 tile shrunk by half: a pixel is set if any of its 2x2 cells is"""
+    # OR neighbouring bytes, then neighbouring rows, as big integers so both passes run in C
+    cols = int.from_bytes(tile, "big")
+    cols = (cols | (cols >> 8)).to_bytes(CHUNK_SIZE * CHUNK_SIZE, "big")[1::2]
+    rows = int.from_bytes(cols, "big")
+    rows = (rows | (rows >> (8 * _HALF))).to_bytes(CHUNK_SIZE * _HALF, "big")
+    return [rows[i:i + _HALF] for i in range(_HALF, CHUNK_SIZE * _HALF, CHUNK_SIZE)]
+
+def _reduce(nw, ne, sw, se):
+    """One 64x64 tile from the four (bytes-like or None) under it, each shrunk by half"""
+    nw, ne, sw, se = [_EMPTY_QUARTER if tile is None else _halve(tile) for tile in (nw, ne, sw, se)]
+    return b"".join([half for left, right in ((nw, ne), (sw, se)) for row in zip(left, right) for half in row])
+
+class ChunkPyramid:
+    """Mipmaps of a chunked grid for zoomed-out views
+    
+    A level-m tile is 64x64 pixels covering 2**m x 2**m chunks, one pixel per
+    2**m x 2**m cells, reduced from the four level m-1 tiles under it (level 0
+    being the chunks themselves). Tiles are built on demand and kept until a chunk
+    under them changes; a count of non-empty chunks per tile lets empty space be
+    skipped at every level without touching the cells.
+    """
+    def __init__(self, grid, levels=-MIN_ZOOM):
+        self.grid = grid
+        self.levels = levels
+        self.seen_generation = None
+        self._reset()
+    
+    def _reset(self):
+        self.tiles = [None] + [{} for _ in range(self.levels)]  # level -> {(tile_row, tile_col): bytes}
+        self.counts = [None] + [{} for _ in range(self.levels)]  # level -> {(tile_row, tile_col): non-empty chunks}
+        self.known = set()  # Non-empty chunks as of the last sync
+    
+    def _count(self, key, delta):
+        for level in range(1, self.levels + 1):
+            tile = (key[0] >> level, key[1] >> level)
+            count = self.counts[level].get(tile, 0) + delta
+            if count:
+                self.counts[level][tile] = count
+            else:
+                del self.counts[level][tile]
+    
+    def sync(self):
+        """Catch up with the grid's changes since the last sync"""
+        if self.seen_generation == self.grid.generation:
+            return
+        changed = None
+        if self.seen_generation is not None:
+            changed = self.grid.changed_since(self.seen_generation)
+        if changed is None:
+            # First sync, or too far behind the grid's change log: rebuild from the non-empty chunks
+            self._reset()
+            changed = self.grid.chunk_keys()
+        for key in changed:
+            present = self.grid.get_chunk(*key) is not None
+            if present != (key in self.known):
+                self._count(key, 1 if present else -1)
+                if present:
+                    self.known.add(key)
+                else:
+                    self.known.discard(key)
+            for level in range(1, self.levels + 1):
+                self.tiles[level].pop((key[0] >> level, key[1] >> level), None)
+        self.seen_generation = self.grid.generation
+    
+    def occupied(self, level, key):
+        return key in self.counts[level]
+    
+    def tile(self, level, key, deadline=None):
+        """Cells of a tile as 64x64 row-major 0/1 bytes
+        
+        None if nothing under it is set, or if the perf_counter() deadline passes
+        before it is built; the tiles finished so far are kept for the next call.
+        """
+        if level == 0:
+            return self.grid.get_chunk(*key)
+        if key not in self.counts[level]:
+            return None
+        tile = self.tiles[level].get(key)
+        if tile is None:
+            row, col = key[0] << 1, key[1] << 1
+            children = []
+            for child in ((row, col), (row, col + 1), (row + 1, col), (row + 1, col + 1)):
+                cells = self.tile(level - 1, child, deadline)
+                if cells is None and level > 1 and child in self.counts[level - 1]:
+                    return None  # Ran out of time below
+                children.append(cells)
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            tile = self.tiles[level][key] = _reduce(*children)
+        return tile
+
+class GridRenderer:
+    """Draws a chunked grid at a float camera position and a power-of-two zoom
+    
+    Zoomed in (zoom >= 0), a chunk's bytes (a bytearray, or a memoryview tile of a
+    MappedGrid) are wrapped as an 8-bit palettized Surface without copying (cell
+    value = palette index, 0 is transparent), scaled to 2**zoom pixels per cell
+    and cached until the grid reports a newer stamp for that chunk. Zoomed out,
+    the 64x64 pixel tiles of the ChunkPyramid level matching the zoom are blitted
+    unscaled, so a frame costs the same few hundred tiles however much of the grid
+    is in view; missing tiles are built within a per-frame time budget. The
+    background with its grid lines is rendered once per size and zoom and shifted
+    by the camera's sub-cell offset.
+    """
+    def __init__(self, grid, zoom, fill_color, line_color, background=(255, 255, 255)):
+        self.grid = grid
+        self.zoom = zoom
+        self.fill_color = fill_color
+        self.line_color = line_color
+        self.background = background
+        self.pyramid = ChunkPyramid(grid)
+        self.cache = {}  # (chunk_row, chunk_col) -> (stamp, scaled surface), zoomed in
+        self.tile_cache = {}  # (level, tile_row, tile_col) -> (tile bytes, surface), zoomed out
+        self.backdrop = None  # Cached background + grid lines
+        self.backdrop_key = None
+        self.incomplete = False  # Some overview tiles in view were left for later frames
+    
+    @property
+    def cell_size(self):
+        """Pixels per cell (a fraction when zoomed out)"""
+        return 2.0 ** self.zoom
+    
+    def _palette(self):
+        return [self.background, self.fill_color] + [(0, 0, 0)] * 254
+    
+    def _cells_surface(self, cells):
+        surface = pygame.image.frombuffer(cells, (CHUNK_SIZE, CHUNK_SIZE), "P")
+        surface.set_palette(self._palette())
+        return surface
+    
+    def _chunk_surface(self, key, chunk):
+        stamp = self.grid.stamps.get(key, 0)  # Chunks unchanged since a mapped grid was opened have none
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        size = CHUNK_SIZE << self.zoom
+        scaled = pygame.transform.scale(self._cells_surface(chunk), (size, size))
+        scaled.set_colorkey(0)
+        self.cache[key] = (stamp, scaled)
+        return scaled
+    
+    def _tile_surface(self, level, key, tile):
+        cached = self.tile_cache.get((level,) + key)
+        if cached is not None and cached[0] is tile:
+            return cached[1]
+        surface = self._cells_surface(tile)
+        surface.set_colorkey(0)
+        self.tile_cache[(level,) + key] = (tile, surface)
+        return surface
+    
+    def _backdrop(self, size):
+        """Background one cell larger than size each way, with grid lines every cell when zoomed in enough"""
+        if self.backdrop is None or self.backdrop_key != (size, self.zoom):
+            cell = max(1, int(self.cell_size))
+            width, height = size[0] + cell, size[1] + cell
+            self.backdrop = pygame.Surface((width, height))
+            self.backdrop.fill(self.background)
+            if self.zoom >= GRID_LINE_ZOOM:
+                for i in range(0, height, cell):
+                    pygame.draw.line(self.backdrop, self.line_color, (0, i), (width, i), 1)
+                for j in range(0, width, cell):
+                    pygame.draw.line(self.backdrop, self.line_color, (j, 0), (j, height), 1)
+            self.backdrop_key = (size, self.zoom)
+        return self.backdrop
+    
+    def set_grid(self, grid):
+        """Switch to another grid (e.g. after loading a file), dropping cached chunks"""
+        self.grid = grid
+        self.pyramid = ChunkPyramid(grid)
+        self.cache.clear()
+        self.tile_cache.clear()
+    
+    def set_zoom(self, zoom):
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.cache.clear()
+            self.tile_cache.clear()
+        return zoom
+    
+    def screen_to_cell(self, pos, camera_x, camera_y):
+        """(row, col) of the cell under a screen position"""
+        scale = self.cell_size
+        return math.floor(camera_y + pos[1] / scale), math.floor(camera_x + pos[0] / scale)
+    
+    def view_cells(self, size, camera_x, camera_y):
+        """(top, left, bottom, right) of the cells at least partly in view"""
+        scale = self.cell_size
+        top, left = math.floor(camera_y), math.floor(camera_x)
+        return top, left, math.ceil(camera_y + size[1] / scale), math.ceil(camera_x + size[0] / scale)
+    
+    def draw(self, surface, camera_x, camera_y):
+        """Draw the cells in view with the point (camera_x, camera_y), in cells, at the top-left corner"""
+        width, height = surface.get_size()
+        scale = self.cell_size
+        # Pixel of cell (0, 0); every cell boundary is a whole number of pixels from it
+        origin_x, origin_y = math.floor(-camera_x * scale), math.floor(-camera_y * scale)
+        cell = max(1, int(scale))
+        surface.blit(self._backdrop((width, height)), (origin_x % cell - cell, origin_y % cell - cell))
+        if self.zoom >= 0:
+            self._draw_chunks(surface, camera_x, camera_y, origin_x, origin_y)
+        else:
+            self._draw_tiles(surface, camera_x, camera_y)
+    
+    def _draw_chunks(self, surface, camera_x, camera_y, origin_x, origin_y):
+        visible = set()
+        top, left, bottom, right = self.view_cells(surface.get_size(), camera_x, camera_y)
+        for chunk_row, chunk_col, chunk in self.grid.chunks_in(top, left, bottom, right):
+            key = (chunk_row, chunk_col)
+            visible.add(key)
+            x = origin_x + ((chunk_col << CHUNK_SHIFT) << self.zoom)
+            y = origin_y + ((chunk_row << CHUNK_SHIFT) << self.zoom)
+            surface.blit(self._chunk_surface(key, chunk), (x, y))
+        
+        # Keep scaled chunks only while they are on screen; they are large at big cell sizes
+        if len(self.cache) > len(visible):
+            for key in [key for key in self.cache if key not in visible]:
+                del self.cache[key]
+    
+    def _draw_tiles(self, surface, camera_x, camera_y):
+        level = -self.zoom
+        self.pyramid.sync()
+        span = CHUNK_SIZE << level  # Cells per tile side
+        origin_x, origin_y = math.floor(-camera_x / (1 << level)), math.floor(-camera_y / (1 << level))
+        top, left, bottom, right = self.view_cells(surface.get_size(), camera_x, camera_y)
+        deadline = time.perf_counter() + TILE_BUILD_BUDGET
+        visible = set()
+        self.incomplete = False
+        for tile_row in range(top // span, (bottom - 1) // span + 1):
+            for tile_col in range(left // span, (right - 1) // span + 1):
+                key = (tile_row, tile_col)
+                if not self.pyramid.occupied(level, key):
+                    continue
+                tile = self.pyramid.tile(level, key, deadline)
+                if tile is None:
+                    self.incomplete = True
+                    continue
+                visible.add((level,) + key)
+                surface.blit(self._tile_surface(level, key, tile),
+                             (origin_x + tile_col * CHUNK_SIZE, origin_y + tile_row * CHUNK_SIZE))
+        
+        if len(self.tile_cache) > len(visible):
+            for key in [key for key in self.tile_cache if key not in visible]:
+                del self.tile_cache[key]
@@ -0,0 +1,450 @@
+﻿import re
+import time
+
+from grid2d_core import CHUNK_SHIFT, CHUNK_SIZE, MappedGrid
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # ChunkStepper falls back to a pure-Python step without NumPy
+
+LIFE = "B3/S23"
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+def parse_rule(rule):
+    """Parse a B/S rulestring such as "B3/S23" (or "23/3") into (birth, survive) frozensets"""
+    text = rule.strip().upper()
+    match = re.fullmatch(r"B([0-8]*)/S([0-8]*)", text) or re.fullmatch(r"S([0-8]*)/B([0-8]*)", text)
+    if match and text.startswith("S"):
+        survive, birth = match.groups()
+    elif match:
+        birth, survive = match.groups()
+    else:
+        match = re.fullmatch(r"([0-8]*)/([0-8]*)", text)  # Classic S/B notation
+        if not match:
+            raise ValueError(f"Invalid rule: {rule}")
+        survive, birth = match.groups()
+    if "0" in birth:
+        raise ValueError("B0 rules are not supported: empty space would fill the unbounded grid")
+    return frozenset(map(int, birth)), frozenset(map(int, survive))
+
+class ChunkStepper:
+    """Steps a B/S rule in place over a chunked grid (ChunkedGrid or MappedGrid)
+    
+    Only chunks next to a change are recomputed: a chunk whose 3x3 chunk
+    neighbourhood did not change in the last generation (nor was painted since)
+    has the same inputs as last time and so keeps its state. With NumPy all
+    active chunks are padded with a one-cell halo from their neighbours, stacked,
+    and advanced together with eight shifted adds and a rule lookup table.
+    """
+    def __init__(self, grid, rule=LIFE):
+        self.grid = grid
+        self.birth, self.survive = parse_rule(rule)
+        self.generation = 0  # Generations stepped
+        self.seen_generation = None  # grid.generation after our last step
+        self.keys = set()  # Non-empty chunks after our last step
+        self.changed = None  # Chunks changed by the last step (None: compute everything)
+        self.last_active = 0  # Chunks computed by the last step
+        if np is not None:
+            self.lut = np.zeros(18, dtype=np.uint8)  # index: alive * 9 + neighbour count
+            for n in self.birth:
+                self.lut[n] = 1
+            for n in self.survive:
+                self.lut[9 + n] = 1
+    
+    def _active_chunks(self):
+        keys = set(self.grid.chunk_keys())
+        outside = None
+        if self.changed is not None and self.seen_generation is not None:
+            # Outside edits: chunks painted, loaded or emptied since our last step
+            outside = self.grid.changed_since(self.seen_generation)
+        if outside is None:
+            changed = keys | self.keys
+        else:
+            changed = set(self.changed) | outside
+        active = set()
+        for chunk_row, chunk_col in changed:
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    active.add((chunk_row + d_row, chunk_col + d_col))
+        return active
+    
+    def step(self):
+        """Advance one generation; return the number of chunks recomputed"""
+        active = self._active_chunks()
+        if np is not None:
+            results = self._step_numpy(active)
+        else:
+            results = self._step_python(active)
+        
+        changed = set()
+        for key, new in results:
+            old = self.grid.get_chunk(*key)
+            if old is None and not new.count(1):
+                continue
+            if old is not None and old == new:
+                continue
+            self.grid.set_chunk(key[0], key[1], new)
+            changed.add(key)
+        
+        self.changed = changed
+        self.keys = set(self.grid.chunk_keys())
+        self.seen_generation = self.grid.generation
+        self.generation += 1
+        self.last_active = len(active)
+        return len(active)
+    
+    def _step_numpy(self, active):
+        keys = sorted(active)
+        if not keys:
+            return []
+        size = CHUNK_SIZE
+        padded = np.zeros((len(keys), size + 2, size + 2), dtype=np.uint8)
+        arrays = {}
+        
+        def cells(key):
+            if key not in arrays:
+                chunk = self.grid.get_chunk(*key)
+                arrays[key] = None if chunk is None else np.frombuffer(chunk, dtype=np.uint8).reshape(size, size)
+            return arrays[key]
+        
+        for i, (chunk_row, chunk_col) in enumerate(keys):
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    source = cells((chunk_row + d_row, chunk_col + d_col))
+                    if source is None:
+                        continue
+                    # Destination rows/cols in the padded tile and the matching source slice
+                    rows = (slice(1, size + 1), slice(0, size)) if d_row == 0 else \
+                        (slice(0, 1), slice(size - 1, size)) if d_row < 0 else (slice(size + 1, size + 2), slice(0, 1))
+                    cols = (slice(1, size + 1), slice(0, size)) if d_col == 0 else \
+                        (slice(0, 1), slice(size - 1, size)) if d_col < 0 else (slice(size + 1, size + 2), slice(0, 1))
+                    padded[i, rows[0], cols[0]] = source[rows[1], cols[1]]
+        
+        counts = (padded[:, :-2, :-2] + padded[:, :-2, 1:-1] + padded[:, :-2, 2:]
+                  + padded[:, 1:-1, :-2] + padded[:, 1:-1, 2:]
+                  + padded[:, 2:, :-2] + padded[:, 2:, 1:-1] + padded[:, 2:, 2:])
+        new = self.lut[padded[:, 1:-1, 1:-1] * 9 + counts]
+        arrays.clear()  # Drop views before writing (mapped tiles can't be resized/closed while viewed)
+        return [(key, bytearray(new[i].tobytes())) for i, key in enumerate(keys)]
+    
+    def _step_python(self, active):
+        counts = {}
+        live = set()
+        for chunk_row, chunk_col in active:
+            chunk = self.grid.get_chunk(chunk_row, chunk_col)
+            if chunk is None:
+                continue
+            base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+            data = chunk if isinstance(chunk, bytearray) else bytes(chunk)
+            index = data.find(1)
+            while index >= 0:
+                row, col = base_row + (index >> CHUNK_SHIFT), base_col + (index & (CHUNK_SIZE - 1))
+                live.add((row, col))
+                index = data.find(1, index + 1)
+        # Neighbour counts around live cells of the active chunks; counts outside them are dropped below
+        for row, col in live:
+            for d_row, d_col in _NEIGHBOURS:
+                cell = (row + d_row, col + d_col)
+                counts[cell] = counts.get(cell, 0) + 1
+        # Live cells in the halo of the active area also feed the counts at its border
+        halo = set()
+        for chunk_row, chunk_col in active:
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    key = (chunk_row + d_row, chunk_col + d_col)
+                    if key not in active:
+                        halo.add(key)
+        for chunk_row, chunk_col in halo:
+            base_row, base_col = chunk_row << CHUNK_SHIFT, chunk_col << CHUNK_SHIFT
+            for row, col in self.grid.cells_in(base_row, base_col, base_row + CHUNK_SIZE, base_col + CHUNK_SIZE):
+                for d_row, d_col in _NEIGHBOURS:
+                    cell = (row + d_row, col + d_col)
+                    if (cell[0] >> CHUNK_SHIFT, cell[1] >> CHUNK_SHIFT) in active:
+                        counts[cell] = counts.get(cell, 0) + 1
+        
+        results = {key: bytearray(CHUNK_SIZE * CHUNK_SIZE) for key in active}
+        for (row, col), n in counts.items():
+            key = (row >> CHUNK_SHIFT, col >> CHUNK_SHIFT)
+            if key not in results:
+                continue
+            alive = (row, col) in live
+            if (n in self.survive) if alive else (n in self.birth):
+                results[key][((row & (CHUNK_SIZE - 1)) << CHUNK_SHIFT) | (col & (CHUNK_SIZE - 1))] = 1
+        return list(results.items())
+
+class _Node:
+    """Canonical quadtree node: level k covers 2**k x 2**k cells; population n"""
+    __slots__ = ("k", "nw", "ne", "sw", "se", "n", "__weakref__")
+    
+    def __init__(self, k, nw, ne, sw, se, n):
+        self.k, self.nw, self.ne, self.sw, self.se, self.n = k, nw, ne, sw, se, n
+
+class HashLife:
+    """Memoized quadtree (HashLife) engine for jumping huge numbers of generations
+    
+    Nodes are hash-consed, and the result of advancing each distinct node is
+    cached, so repetitive patterns advance 2**j generations at a time in time
+    that depends on their structure rather than their area or the jump length.
+    The pattern sits in a root square whose center stays at a fixed cell.
+    A bounded grid (a MappedGrid) is dead outside its cells, which no power-of-two
+    jump can respect, so advance() with bounds steps one generation at a time and
+    clips the root to them after each, by AND with a memoized mask quadtree.
+    """
+    def __init__(self, rule=LIFE):
+        self.birth, self.survive = parse_rule(rule)
+        self.off = _Node(0, None, None, None, None, 0)
+        self.on = _Node(0, None, None, None, None, 1)
+        self.nodes = {}  # (nw, ne, sw, se) ids -> node
+        self.zeros = [self.off]
+        self.fulls = [self.on]
+        self.masks = {}  # (k, top, left, rows, cols) -> mask node of the cells inside the bounds
+        self.clipped = {}  # (id(node), id(mask)) -> node AND mask
+        self.results = {}  # (id(node), j) -> node advanced 2**j generations
+        self.root = self.zero(3)
+        self.center = (0, 0)  # Cell at the root's center (root covers center - 2**(k-1) ... + 2**(k-1))
+        self.generation = 0
+    
+    def join(self, nw, ne, sw, se):
+        key = (id(nw), id(ne), id(sw), id(se))
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = _Node(nw.k + 1, nw, ne, sw, se, nw.n + ne.n + sw.n + se.n)
+        return node
+    
+    def zero(self, k):
+        while len(self.zeros) <= k:
+            z = self.zeros[-1]
+            self.zeros.append(self.join(z, z, z, z))
+        return self.zeros[k]
+    
+    def full(self, k):
+        while len(self.fulls) <= k:
+            f = self.fulls[-1]
+            self.fulls.append(self.join(f, f, f, f))
+        return self.fulls[k]
+    
+    def centre(self, m):
+        """The node one level up with m in its middle"""
+        z = self.zero(m.k - 1)
+        return self.join(self.join(z, z, z, m.nw), self.join(z, z, m.ne, z),
+                         self.join(z, m.sw, z, z), self.join(m.se, z, z, z))
+    
+    def _cell(self, alive, count):
+        return self.on if (count in self.survive if alive else count in self.birth) else self.off
+    
+    def _base(self, m):
+        """Level-2 node (4x4) -> its central 2x2 after one generation"""
+        bits = [[0] * 4 for _ in range(4)]
+        for y0, quad_row in enumerate(((m.nw, m.ne), (m.sw, m.se))):
+            for x0, quad in enumerate(quad_row):
+                for y1, sub_row in enumerate(((quad.nw, quad.ne), (quad.sw, quad.se))):
+                    for x1, leaf in enumerate(sub_row):
+                        bits[y0 * 2 + y1][x0 * 2 + x1] = leaf.n
+        out = []
+        for y in (1, 2):
+            for x in (1, 2):
+                count = sum(bits[y + dy][x + dx] for dy, dx in _NEIGHBOURS)
+                out.append(self._cell(bits[y][x], count))
+        return self.join(*out)
+    
+    def successor(self, m, j):
+        """Central half of m (level k-1) advanced 2**j generations, j <= k - 2"""
+        if m.n == 0:
+            return m.nw
+        j = min(j, m.k - 2)
+        key = (id(m), j)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        if m.k == 2:
+            result = self._base(m)
+        else:
+            # Nine overlapping level k-1 subsquares
+            c1 = self.successor(m.nw, j)
+            c2 = self.successor(self.join(m.nw.ne, m.ne.nw, m.nw.se, m.ne.sw), j)
+            c3 = self.successor(m.ne, j)
+            c4 = self.successor(self.join(m.nw.sw, m.nw.se, m.sw.nw, m.sw.ne), j)
+            c5 = self.successor(self.join(m.nw.se, m.ne.sw, m.sw.ne, m.se.nw), j)
+            c6 = self.successor(self.join(m.ne.sw, m.ne.se, m.se.nw, m.se.ne), j)
+            c7 = self.successor(m.sw, j)
+            c8 = self.successor(self.join(m.sw.ne, m.se.nw, m.sw.se, m.se.sw), j)
+            c9 = self.successor(m.se, j)
+            if j < m.k - 2:
+                # Fewer generations than a full double step: take the centres without advancing again
+                result = self.join(
+                    self.join(c1.se, c2.sw, c4.ne, c5.nw), self.join(c2.se, c3.sw, c5.ne, c6.nw),
+                    self.join(c4.se, c5.sw, c7.ne, c8.nw), self.join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                result = self.join(
+                    self.successor(self.join(c1, c2, c4, c5), j), self.successor(self.join(c2, c3, c5, c6), j),
+                    self.successor(self.join(c4, c5, c7, c8), j), self.successor(self.join(c5, c6, c8, c9), j))
+        self.results[key] = result
+        return result
+    
+    def load(self, grid):
+        """Replace the pattern with the set cells of a grid"""
+        cells = []
+        for key in grid.chunk_keys():
+            base_row, base_col = key[0] << CHUNK_SHIFT, key[1] << CHUNK_SHIFT
+            cells.extend(grid.cells_in(base_row, base_col, base_row + CHUNK_SIZE, base_col + CHUNK_SIZE))
+        self.generation = 0
+        if not cells:
+            self.root, self.center = self.zero(3), (0, 0)
+            return
+        top = min(row for row, _ in cells)
+        left = min(col for _, col in cells)
+        extent = max(max(row for row, _ in cells) - top, max(col for _, col in cells) - left) + 1
+        k = max(3, (extent - 1).bit_length())
+        self.root = self._build(k, top, left, set(cells))
+        half = 1 << (k - 1)
+        self.center = (top + half, left + half)
+    
+    def _build(self, k, top, left, cells):
+        if not cells:
+            return self.zero(k)
+        if k == 0:
+            return self.on
+        half = 1 << (k - 1)
+        quads = ([], [], [], [])
+        for row, col in cells:
+            quads[(row >= top + half) * 2 + (col >= left + half)].append((row, col))
+        return self.join(self._build(k - 1, top, left, quads[0]), self._build(k - 1, top, left + half, quads[1]),
+                         self._build(k - 1, top + half, left, quads[2]),
+                         self._build(k - 1, top + half, left + half, quads[3]))
+    
+    def advance(self, generations, bounds=None):
+        """Advance the pattern by any number of generations, one power of two per set bit
+        
+        With bounds (rows, cols), cells outside rows [0, rows) x cols [0, cols)
+        are cleared after every generation, as on a MappedGrid.
+        """
+        if bounds is not None:
+            for _ in range(generations):
+                self._step(0)
+                self._clip(bounds)
+                self._crop()
+            return
+        j = 0
+        while generations:
+            if generations & 1:
+                self._step(j)
+            generations >>= 1
+            j += 1
+        self._crop()
+    
+    def _step(self, j):
+        # Pad until the root is big enough for a 2**j step and the pattern cannot reach the edge
+        root = self.centre(self.centre(self.root))
+        while root.k < j + 3:
+            root = self.centre(root)
+        self.root = self.successor(root, j)
+        self.generation += 1 << j
+    
+    def _clip(self, bounds):
+        half = 1 << (self.root.k - 1)
+        self.root = self._and(self.root, self._mask(self.root.k, self.center[0] - half, self.center[1] - half, *bounds))
+    
+    def _mask(self, k, top, left, rows, cols):
+        """Level-k node at (top, left) with the cells inside rows [0, rows) x cols [0, cols) set"""
+        size = 1 << k
+        if top >= rows or left >= cols or top + size <= 0 or left + size <= 0:
+            return self.zero(k)
+        if top >= 0 and left >= 0 and top + size <= rows and left + size <= cols:
+            return self.full(k)
+        key = (k, top, left, rows, cols)
+        mask = self.masks.get(key)
+        if mask is None:
+            half = size >> 1
+            mask = self.masks[key] = self.join(
+                self._mask(k - 1, top, left, rows, cols), self._mask(k - 1, top, left + half, rows, cols),
+                self._mask(k - 1, top + half, left, rows, cols), self._mask(k - 1, top + half, left + half, rows, cols))
+        return mask
+    
+    def _and(self, node, mask):
+        if node.n == 0 or mask.n == 0:
+            return self.zero(node.k)
+        if mask is self.full(mask.k):
+            return node
+        key = (id(node), id(mask))
+        result = self.clipped.get(key)
+        if result is None:
+            result = self.clipped[key] = self.join(self._and(node.nw, mask.nw), self._and(node.ne, mask.ne),
+                                                   self._and(node.sw, mask.sw), self._and(node.se, mask.se))
+        return result
+    
+    def _crop(self):
+        """Shrink the root while the pattern fits in its central half"""
+        root = self.root
+        while root.k > 3:
+            z = self.zero(root.k - 2)
+            if (root.nw.nw, root.nw.ne, root.nw.sw) != (z, z, z) or (root.ne.nw, root.ne.ne, root.ne.se) != (z, z, z) \
+                    or (root.sw.nw, root.sw.sw, root.sw.se) != (z, z, z) or (root.se.ne, root.se.sw, root.se.se) != (z, z, z):
+                break
+            root = self.join(root.nw.se, root.ne.sw, root.sw.ne, root.se.nw)
+        self.root = root
+    
+    @property
+    def population(self):
+        return self.root.n
+    
+    def store(self, grid):
+        """Write the pattern into a grid (cleared first)"""
+        half = 1 << (self.root.k - 1)
+        spans = []
+        self._collect(self.root, self.center[0] - half, self.center[1] - half, spans)
+        grid.clear()  # Only once the spans are ready, so a failure leaves the grid untouched
+        grid.fill_spans(spans, 1)
+    
+    def _collect(self, node, top, left, spans):
+        if node.n == 0:
+            return
+        if node.k == 0:
+            spans.append((top, left, left + 1))
+            return
+        half = 1 << (node.k - 1)
+        self._collect(node.nw, top, left, spans)
+        self._collect(node.ne, top, left + half, spans)
+        self._collect(node.sw, top + half, left, spans)
+        self._collect(node.se, top + half, left + half, spans)
+
+def run(grid, generations, rule=LIFE, engine="chunks", workers=None):
+    """Advance a grid in place headlessly; return throughput stats
+    
+    engine is "chunks" (ChunkStepper), "tiles" (TiledExecutor over `workers`
+    processes) or "hashlife". cells_per_second counts every
+    cell of the final bounding box of non-empty chunks once per generation, so the
+    two engines are comparable on the same pattern. On a MappedGrid every engine
+    treats the cells outside the map as dead on every generation.
+    """
+    start = time.perf_counter()
+    if engine == "hashlife":
+        life = HashLife(rule)
+        life.load(grid)
+        life.advance(generations, (grid.rows, grid.cols) if isinstance(grid, MappedGrid) else None)
+        life.store(grid)
+    elif engine == "chunks":
+        stepper = ChunkStepper(grid, rule)
+        for _ in range(generations):
+            stepper.step()
+    elif engine == "tiles":
+        from grid2d_parallel import TiledExecutor  # Imports this module
+        with TiledExecutor(workers) as executor:
+            executor.step(grid, rule, generations)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    seconds = time.perf_counter() - start
+    
+    keys = grid.chunk_keys()
+    area = 0
+    if keys:
+        rows = max(key[0] for key in keys) - min(key[0] for key in keys) + 1
+        cols = max(key[1] for key in keys) - min(key[1] for key in keys) + 1
+        area = rows * cols * CHUNK_SIZE * CHUNK_SIZE
+    return {
+        "engine": engine,
+        "generations": generations,
+        "seconds": seconds,
+        "population": len(grid),
+        "cells_per_second": area * generations / seconds if seconds > 0 else float("inf"),
+    }
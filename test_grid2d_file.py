@@ -0,0 +1,35 @@
+﻿import json
+
+from grid2d_core import ChunkedGrid
+from grid2d_file import json_grid_data, load_grid_file
+
+def _round_trip(grid, tmp_path):
+    path = tmp_path / "grid.g2d"
+    with open(path, "w") as f:
+        json.dump(json_grid_data(grid), f)
+    with open(path) as f:
+        data = json.load(f)
+    return data, load_grid_file(str(path))
+
+def _cells(grid):
+    bounds = grid.bounds()
+    return set(grid.cells_in(*bounds)) if bounds else set()
+
+def test_non_negative_grid_saves_plain_rows(tmp_path):
+    grid = ChunkedGrid.from_rows([[0, 1, 0], [0, 0, 1], [1, 1, 1]], 5, 70)  # A glider away from the origin
+    data, loaded = _round_trip(grid, tmp_path)
+    assert isinstance(data, list)
+    assert len(data) == 8 and all(len(row) == 73 for row in data)
+    assert _cells(loaded) == _cells(grid)
+
+def test_negative_grid_saves_origin(tmp_path):
+    grid = ChunkedGrid.from_rows([[0, 1, 0], [0, 0, 1], [1, 1, 1]], -70, 3)
+    data, loaded = _round_trip(grid, tmp_path)
+    assert data["origin"] == [-70, 3]
+    assert len(data["rows"]) == 3 and all(len(row) == 3 for row in data["rows"])
+    assert _cells(loaded) == _cells(grid)
+
+def test_empty_grid_round_trips(tmp_path):
+    data, loaded = _round_trip(ChunkedGrid(), tmp_path)
+    assert data == []
+    assert loaded.bounds() is None
@@ -0,0 +1,56 @@
+﻿import random
+import shutil
+
+import pytest
+
+from grid2d_core import MappedGrid
+from grid2d_sim import run
+
+ROWS, COLS = 128, 192  # Whole chunks, so the map edge is exactly the grid edge
+
+def _reference(cells, generations):
+    """Brute-force Life with everything outside the map dead every generation"""
+    for _ in range(generations):
+        counts = {}
+        for row, col in cells:
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    if d_row or d_col:
+                        cell = (row + d_row, col + d_col)
+                        counts[cell] = counts.get(cell, 0) + 1
+        cells = {cell for cell, n in counts.items()
+                 if 0 <= cell[0] < ROWS and 0 <= cell[1] < COLS and (n == 3 or (n == 2 and cell in cells))}
+    return cells
+
+@pytest.fixture
+def soup(tmp_path):
+    """A mapped grid with a random soup and live cells along all four edges"""
+    rng = random.Random(3)
+    path = str(tmp_path / "soup.g2m")
+    grid = MappedGrid.create(path, ROWS, COLS)
+    for _ in range(5000):
+        grid.set(rng.randrange(ROWS), rng.randrange(COLS), 1)
+    for col in range(COLS):
+        grid.set(0, col, rng.randint(0, 1))
+        grid.set(ROWS - 1, col, rng.randint(0, 1))
+    for row in range(ROWS):
+        grid.set(row, 0, rng.randint(0, 1))
+        grid.set(row, COLS - 1, rng.randint(0, 1))
+    cells = set(grid.cells_in(0, 0, ROWS, COLS))
+    grid.close()
+    return path, cells
+
+@pytest.mark.parametrize("engine", ["chunks", "tiles", "hashlife"])
+def test_engines_agree_on_mapped_grid_edges(soup, tmp_path, engine):
+    path, cells = soup
+    copy = str(tmp_path / f"{engine}.g2m")
+    shutil.copy(path, copy)
+    grid = MappedGrid(copy)
+    try:
+        stats = run(grid, 70, engine=engine, workers=1)  # More than one 64-generation tile batch
+        result = set(grid.cells_in(0, 0, ROWS, COLS))
+    finally:
+        grid.close()
+    expected = _reference(cells, 70)
+    assert result == expected
+    assert stats["population"] == len(expected)